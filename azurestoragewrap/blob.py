@@ -10,7 +10,7 @@ from mimetypes import guess_type, guess_extension, guess_all_extensions
 
 
 """ helpers """
-from azurestoragewrap.snippets import safe_cast, test_azurestorage_nameconventions
+from azurestoragewrap.snippets import safe_cast, test_azurestorage_nameconventions, get_request_session, DEFAULT_POOL_SIZE
 
 """ encryption """
 from azurestoragewrap.encryption import (
@@ -240,14 +240,20 @@ class StorageBlobContext():
         - AZURE_KEY_IDENTIFIER
         - AZURE_SECRET_KEY
         - AZURE_STORAGE_IS_EMULATED
+        Optional setting is:
+        - AZURE_STORAGE_POOL_SIZE (connections per pooled http session)
     """
 
     _account = None
     _account_name = ''
     _account_key = ''
     _is_emulated = False
+    _requestsession = None
+    _blobservices = {}
 
     _modeldefinitions = []
+    _modelindex = {}
+    _containerindex = {}
     REGISTERED = True
 
     """ decorators """
@@ -262,17 +268,11 @@ class StorageBlobContext():
             
                 """ find modeldefinition for StorageQueueModel or StorageQueueModel """
                 if isinstance(storagemodel, StorageBlobModel):
-                    definitionlist = [definition for definition in self._modeldefinitions if definition['modelname'] == storagemodel.__class__.__name__]
+                    modeldefinition = self._modelindex.get(storagemodel.__class__, None)
                 else:
                     log.info('Argument is not an StorageBlobModel')
                     raise AzureStorageWrapException(storagemodel, "Argument is not an StorageBlobModel")
                 
-                if len(definitionlist) == 1:
-                    modeldefinition = definitionlist[0]
-
-                elif len(definitionlist) > 1:
-                    raise ModelRegisteredMoreThanOnceError(storagemodel)
-
                 if registered and (not isinstance(modeldefinition, dict)):
                     raise ModelNotRegisteredError(storagemodel)
 
@@ -301,9 +301,43 @@ class StorageBlobContext():
         else:
             raise AzureException
 
-        """ registered models """
+        """ pooled http session shared per storage account and services per encryption configuration """
+        self._requestsession = get_request_session(self._account, kwargs.get('AZURE_STORAGE_POOL_SIZE', DEFAULT_POOL_SIZE))
+        self._blobservices = {}
+
+        """ registered models and indexes by model class and container """
         self._modeldefinitions = []
+        self._modelindex = {}
+        self._containerindex = {}
  
+    def __blobservice__(self, encrypt) -> BlockBlobService:
+        """ return the BlockBlobService shared by all models with the same encryption configuration """
+        blobservice = self._blobservices.get(encrypt, None)
+
+        if blobservice is None:
+            blobservice = self._account.create_block_blob_service()
+            blobservice.request_session = self._requestsession
+
+            if encrypt:
+
+                # Create the KEK used for encryption.
+                # KeyWrapper is the provided sample implementation, but the user may use their own object as long as it implements the interface above.
+                kek = KeyWrapper(self._key_identifier, self._secret_key) #  Key identifier
+
+                # Create the key resolver used for decryption.
+                # KeyResolver is the provided sample implementation, but the user may use whatever implementation they choose so long as the function set on the service object behaves appropriately.
+                key_resolver = KeyResolver()
+                key_resolver.put_key(kek)                           
+
+                # Set the require Encryption, KEK and key resolver on the service object.
+                blobservice.require_encryption = True
+                blobservice.key_encryption_key = kek
+                blobservice.key_resolver_function = key_resolver.resolve_key
+
+            self._blobservices[encrypt] = blobservice
+
+        return blobservice
+
     def __create__(self, modeldefinition:dict) -> bool:
         if (not modeldefinition['blobservice'] is None):
             try:
@@ -343,7 +377,7 @@ class StorageBlobContext():
         if modeldefinition is None:
             
             """ test if containername already exists """
-            if [model for model in self._modeldefinitions if model['container'] == storagemodel._containername]:
+            if storagemodel._containername in self._containerindex:
                 raise NameConventionError(storagemodel._containername)
 
             """ test if containername fits to azure naming rules """
@@ -353,31 +387,17 @@ class StorageBlobContext():
             """ now register model """
             modeldefinition = {
                 'modelname': storagemodel.__class__.__name__,
+                'modelclass': storagemodel.__class__,
                 'container': storagemodel._containername,
                 'encrypt': storagemodel._encrypt,
-                'blobservice': self._account.create_block_blob_service()
+                'blobservice': self.__blobservice__(storagemodel._encrypt)
                 }    
 
-            """ encrypt queue service """
-            if modeldefinition['encrypt']:
-
-                # Create the KEK used for encryption.
-                # KeyWrapper is the provided sample implementation, but the user may use their own object as long as it implements the interface above.
-                kek = KeyWrapper(self._key_identifier, self._secret_key) #  Key identifier
-
-                # Create the key resolver used for decryption.
-                # KeyResolver is the provided sample implementation, but the user may use whatever implementation they choose so long as the function set on the service object behaves appropriately.
-                key_resolver = KeyResolver()
-                key_resolver.put_key(kek)                           
-
-                # Set the require Encryption, KEK and key resolver on the service object.
-                modeldefinition['blobservice'].require_encryption = True
-                modeldefinition['blobservice'].key_encryption_key = kek
-                modeldefinition['blobservice'].key_resolver_funcion = key_resolver.resolve_key
-            
             self.__create__(modeldefinition)
                 
             self._modeldefinitions.append(modeldefinition)
+            self._modelindex[modeldefinition['modelclass']] = modeldefinition
+            self._containerindex[modeldefinition['container']] = modeldefinition
 
             log.info('model {} registered successfully. Models are {!s}.'.format(modeldefinition['modelname'], [model['modelname'] for model in self._modeldefinitions]))
         else:
@@ -398,10 +418,9 @@ class StorageBlobContext():
         """
         
         """ remove from modeldefinitions """
-        for i in range(len(self._modeldefinitions)):
-            if self._modeldefinitions[i]['modelname'] == modeldefinition['modelname']:
-                del self._modeldefinitions[i]
-                break
+        self._modeldefinitions.remove(modeldefinition)
+        del self._modelindex[modeldefinition['modelclass']]
+        del self._containerindex[modeldefinition['container']]
 
         """ delete queue from storage if delete_queue == True """        
         if delete_blob:
@@ -0,0 +1,326 @@
+""" imports & globals """
+import argparse
+import csv
+import datetime
+import importlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dateutil import parser as dateparser
+
+""" azurestoragewrap """
+from azurestoragewrap.table import StorageTableContext, StorageTableModel, StorageTableQuery, entityvalue
+from azurestoragewrap.snippets import safe_cast, DEFAULT_POOL_SIZE
+from azurestoragewrap.exception import AzureStorageWrapException
+
+""" logging """
+import logging
+log = logging.getLogger('azurestoragewrap')
+
+FORMATS = ('csv', 'jsonl')
+
+""" environment variables read by the command line """
+CONFIG = {
+    'AZURE_STORAGE_NAME': str,
+    'AZURE_STORAGE_KEY': str,
+    'AZURE_STORAGE_IS_EMULATED': bool,
+    'AZURE_STORAGE_POOL_SIZE': int,
+    'AZURE_KEY_IDENTIFIER': str,
+    'AZURE_SECRET_KEY': str
+    }
+
+
+""" helpers """
+def fileformat(path, format=None) -> str:
+    """ csv or jsonl given by format or by the file extension """
+    if format is None:
+        format = os.path.splitext(path)[1].lstrip('.').lower()
+        if format in ['json', 'ndjson']:
+            format = 'jsonl'
+
+    if not format in FORMATS:
+        raise AzureStorageWrapException(msg='unknown file format {!s} of {!s}, use one of {!s}'.format(format, path, ', '.join(FORMATS)))
+    return format
+
+def readcheckpoint(checkpoint) -> dict:
+    """ progress saved by a previous run or {} """
+    if (not checkpoint is None) and os.path.isfile(checkpoint):
+        with open(checkpoint, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+def writecheckpoint(checkpoint, state):
+    """ save progress atomically, a crash never leaves a half written checkpoint """
+    if not checkpoint is None:
+        temp = checkpoint + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp, checkpoint)
+
+def readrows(path, format, skip=0):
+    """ lazily yield the rows (dict) of a csv or jsonl file, skipping the first skip rows """
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        if format == 'csv':
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip() != '')
+
+        for index, row in enumerate(rows):
+            if index >= skip:
+                yield row
+
+def fromrow(modelclass, row) -> StorageTableModel:
+    """ model from a csv or jsonl row, dates of properties without date format are expected in iso format """
+    values = {}
+    for key, to_type, default, dformat in modelclass._schema.fields:
+        if key in row:
+            value = row[key]
+            if isinstance(value, str) and (dformat == '') and (to_type in [datetime.datetime, datetime.date]):
+                try:
+                    value = dateparser.parse(value)
+                    if to_type is datetime.date:
+                        value = value.date()
+                except (ValueError, OverflowError):
+                    value = default
+            values[key] = value
+
+    return modelclass(**values)
+
+def torow(entity, keys, defaults, formats) -> dict:
+    """ csv or jsonl row of a queried entity, dates are formatted by the model or in iso format """
+    row = {}
+    for key in keys:
+        value = entityvalue(entity.get(key, defaults.get(key, '')))
+        if isinstance(value, datetime.datetime) and (not value.tzinfo is None):
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            value = value.strftime(formats[key]) if formats.get(key, '') != '' else value.isoformat()
+        row[key] = value
+    return row
+
+
+""" library entry points """
+def import_table(db, storagemodel, path, format=None, max_workers=DEFAULT_POOL_SIZE, checkpoint=None, checkpoint_rows=10000, progress=None) -> dict:
+    """ stream a csv or jsonl file into the table of a registered StorageTableModel
+
+        rows are grouped by PartitionKey into entity group transactions (see insert_many) committed by max_workers threads.
+        memory stays constant: at most 2 * max_workers batches are in flight and buffered rows of incomplete partitions
+        are flushed when the buffer is full. every checkpoint_rows rows all batches are committed and the row count is
+        saved to checkpoint, a rerun with the same checkpoint resumes after the saved row (entities are upserted).
+
+        required Parameters are:
+        - db: StorageTableContext (storagemodel registered)
+        - storagemodel: StorageTableModel(Object)
+        - path: str (csv with header or jsonl file)
+
+        Optional Parameters are:
+        - format: 'csv' | 'jsonl' (default by file extension)
+        - max_workers: int (concurrent batch commits)
+        - checkpoint: str (file to save and resume progress)
+        - checkpoint_rows: int
+        - progress: function(rows, failed) called at every checkpoint
+
+        returns {'rows': rows read, 'failed': rows not committed}
+    """
+    modelclass = storagemodel.__class__
+    db.getmodeldefinition(storagemodel, True)
+    format = fileformat(path, format)
+
+    state = readcheckpoint(checkpoint)
+    rows = state.get('rows', 0)
+    failed = state.get('failed', 0)
+    if rows > 0:
+        log.info('resume import of {!s} into {!s} after {!s} rows'.format(path, modelclass._schema.tablename, rows))
+
+    maxpending = 2 * max_workers
+    maxbuffered = db.MAX_BATCH_SIZE * maxpending
+    partitions = {}
+    buffered = 0
+    pending = set()
+
+    def commit(storagemodels) -> int:
+        return len([model for model in db.insert_many(storagemodels) if not model._exists])
+
+    with ThreadPoolExecutor(max_workers) as executor:
+
+        def submit(storagemodels):
+            nonlocal pending, failed
+            while len(pending) >= maxpending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                failed += sum([future.result() for future in done])
+            pending.add(executor.submit(commit, storagemodels))
+
+        def flush():
+            nonlocal pending, failed, buffered
+            for partitionkey in list(partitions):
+                submit(partitions.pop(partitionkey))
+            done, pending = wait(pending)
+            failed += sum([future.result() for future in done])
+            buffered = 0
+
+        for row in readrows(path, format, rows):
+            storagemodel = fromrow(modelclass, row)
+            batch = partitions.setdefault(storagemodel.getPartitionKey(), [])
+            batch.append(storagemodel)
+            buffered += 1
+            rows += 1
+
+            if len(batch) >= db.MAX_BATCH_SIZE:
+                buffered -= len(batch)
+                submit(partitions.pop(storagemodel.getPartitionKey()))
+
+            elif buffered >= maxbuffered:
+                """ too many small partitions, commit the largest one """
+                largest = max(partitions, key=lambda partitionkey: len(partitions[partitionkey]))
+                buffered -= len(partitions[largest])
+                submit(partitions.pop(largest))
+
+            if rows % checkpoint_rows == 0:
+                flush()
+                writecheckpoint(checkpoint, {'rows': rows, 'failed': failed})
+                if not progress is None:
+                    progress(rows, failed)
+
+        flush()
+
+    writecheckpoint(checkpoint, {'rows': rows, 'failed': failed})
+    if not progress is None:
+        progress(rows, failed)
+
+    log.info('imported {!s} rows of {!s} into {!s}, {!s} failed'.format(rows, path, modelclass._schema.tablename, failed))
+    return {'rows': rows, 'failed': failed}
+
+def export_table(db, storagequery, path, format=None, page_size=1000, checkpoint=None, progress=None) -> dict:
+    """ stream the entities of a query page by page into a csv or jsonl file
+
+        columns are PartitionKey, RowKey and the (selected) properties of the queried model. after every page the
+        continuation marker and the file size are saved to checkpoint, a rerun with the same checkpoint truncates the
+        file to the saved size and appends the remaining pages. memory is bound by page_size.
+
+        required Parameters are:
+        - db: StorageTableContext (model of storagequery registered)
+        - storagequery: StorageTableQuery(Object)
+        - path: str (csv or jsonl file)
+
+        Optional Parameters are:
+        - format: 'csv' | 'jsonl' (default by file extension)
+        - page_size: int (entities requested per round trip)
+        - checkpoint: str (file to save and resume progress)
+        - progress: function(rows, failed) called after every page
+
+        returns {'rows': rows written, 'failed': 0}
+    """
+    modeldefinition = db.getmodeldefinition(storagequery, True)
+    format = fileformat(path, format)
+
+    schema = storagequery._storagemodel._schema
+    keys = list(storagequery.__columntypes__())
+    formats = {key: dformat for key, to_type, default, dformat in schema.fields}
+
+    state = readcheckpoint(checkpoint)
+    rows = state.get('rows', 0)
+    marker = state.get('marker', None)
+    resume = 'offset' in state
+
+    if resume and marker is None:
+        log.info('export of {!s} into {!s} is already complete'.format(schema.tablename, path))
+        return {'rows': rows, 'failed': 0}
+
+    with open(path, 'a' if resume else 'w', newline='', encoding='utf-8') as f:
+        if resume:
+            log.info('resume export of {!s} into {!s} after {!s} rows'.format(schema.tablename, path, rows))
+            f.truncate(state['offset'])
+
+        writer = None
+        if format == 'csv':
+            writer = csv.DictWriter(f, fieldnames=keys)
+            if not resume:
+                writer.writeheader()
+
+        while True:
+            entities, marker = db.__querypage__(modeldefinition, storagequery, page_size, marker)
+            for entity in entities:
+                row = torow(entity, keys, schema.defaults, formats)
+                if writer is None:
+                    f.write(json.dumps(row) + '\n')
+                else:
+                    writer.writerow(row)
+
+            rows += len(entities)
+            f.flush()
+            writecheckpoint(checkpoint, {'rows': rows, 'marker': marker, 'offset': f.tell()})
+            if not progress is None:
+                progress(rows, 0)
+
+            if marker is None:
+                break
+
+    log.info('exported {!s} rows of {!s} into {!s}'.format(rows, schema.tablename, path))
+    return {'rows': rows, 'failed': 0}
+
+
+""" command line """
+def loadmodel(name) -> StorageTableModel:
+    """ instance of a StorageTableModel given as module:Class """
+    module, sep, classname = name.partition(':')
+    modelclass = getattr(importlib.import_module(module), classname, None) if sep == ':' else None
+
+    if not (isinstance(modelclass, type) and issubclass(modelclass, StorageTableModel)):
+        raise AzureStorageWrapException(msg='{!s} is not a StorageTableModel given as module:Class'.format(name))
+    return modelclass()
+
+def main(argv=None) -> int:
+    """ azurestoragewrap import|export module:Model file
+
+        storage account and encryption key are read from the environment variables AZURE_STORAGE_NAME,
+        AZURE_STORAGE_KEY, AZURE_STORAGE_IS_EMULATED, AZURE_STORAGE_POOL_SIZE, AZURE_KEY_IDENTIFIER and AZURE_SECRET_KEY
+    """
+    parser = argparse.ArgumentParser(prog='azurestoragewrap', description='stream csv or jsonl files into and out of azure storage tables')
+    commands = parser.add_subparsers(dest='command')
+
+    importparser = commands.add_parser('import', help='insert or replace the rows of a file as entities of a model')
+    importparser.add_argument('--workers', type=int, default=DEFAULT_POOL_SIZE, help='concurrent batch commits')
+
+    exportparser = commands.add_parser('export', help='write the entities of a model into a file')
+    exportparser.add_argument('--partitionkey', default=None, help='export one partition only')
+    exportparser.add_argument('--page-size', type=int, default=1000, help='entities requested per round trip')
+
+    for commandparser in [importparser, exportparser]:
+        commandparser.add_argument('model', help='StorageTableModel given as module:Class')
+        commandparser.add_argument('path', help='csv or jsonl file')
+        commandparser.add_argument('--format', choices=FORMATS, default=None, help='default by file extension')
+        commandparser.add_argument('--checkpoint', default=None, help='file to save progress and resume from')
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 2
+
+    config = {}
+    for key, to_type in CONFIG.items():
+        if key in os.environ:
+            config[key] = safe_cast(os.environ[key], to_type, to_type())
+
+    def progress(rows, failed):
+        sys.stderr.write('{!s}: {!s} rows, {!s} failed\n'.format(args.command, rows, failed))
+
+    try:
+        storagemodel = loadmodel(args.model)
+        db = StorageTableContext(**config)
+        db.register_model(storagemodel)
+
+        if args.command == 'import':
+            result = import_table(db, storagemodel, args.path, args.format, args.workers, args.checkpoint, progress=progress)
+        else:
+            storagequery = StorageTableQuery(storagemodel, pkcondition='eq' if args.partitionkey else '', pkforeignkey=args.partitionkey or '')
+            result = export_table(db, storagequery, args.path, args.format, args.page_size, args.checkpoint, progress=progress)
+
+    except Exception as e:
+        sys.stderr.write('{!s} failed because {!s}\n'.format(args.command, e))
+        return 1
+
+    return 1 if result['failed'] > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
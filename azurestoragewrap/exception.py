@@ -31,4 +31,18 @@ class ModelRegisteredMoreThanOnceError(AzureStorageWrapException):
     """If the Model is registered multiple times"""
     def __init__(self, storagemodel=None):
         msg = 'Something strange happend. Model {!s} is registered multipe times'.format(storagemodel)
-        super(ModelRegisteredMoreThanOnceError, self).__init__(storagemodel, msg)
\ No newline at end of file
+        super(ModelRegisteredMoreThanOnceError, self).__init__(storagemodel, msg)
+
+class BulkOperationError(AzureStorageWrapException):
+    """If one or more operations of a bulk/ parallel execution failed"""
+    def __init__(self, results=None, errors=None):
+        self.results = results if results is not None else []
+        self.errors = errors if errors is not None else []
+        msg = '{!s} of {!s} operations failed: {!s}'.format(len(self.errors), len(self.results), '; '.join(['{!s}'.format(error) for index, error in self.errors]))
+        super(BulkOperationError, self).__init__(None, msg)
+
+class EntityConflictError(AzureStorageWrapException):
+    """If a conditional write failed because the entity was changed (etag does not match) or already exists"""
+    def __init__(self, storagemodel=None):
+        msg = 'Entity {!s} was changed or created by someone else in between, reload and retry'.format(storagemodel)
+        super(EntityConflictError, self).__init__(storagemodel, msg)
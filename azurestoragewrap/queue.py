@@ -6,10 +6,11 @@ from azure.storage.queue import QueueService, QueueMessage
 import datetime
 from ast import literal_eval
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 
 
 """ helpers """
-from azurestoragewrap.snippets import safe_cast, test_azurestorage_nameconventions
+from azurestoragewrap.snippets import safe_cast, test_azurestorage_nameconventions, get_request_session, DEFAULT_POOL_SIZE
 
 """ encryption """
 from azurestoragewrap.encryption import (
@@ -18,7 +19,7 @@ from azurestoragewrap.encryption import (
     )
 
 """ custom Exceptions """
-from azurestoragewrap.exception import  AzureStorageWrapException, NameConventionError, ModelNotRegisteredError, ModelRegisteredMoreThanOnceError
+from azurestoragewrap.exception import  AzureStorageWrapException, NameConventionError, ModelNotRegisteredError, ModelRegisteredMoreThanOnceError, BulkOperationError
 
 """ logging """
 import logging
@@ -72,14 +73,16 @@ class StorageQueueModel(QueueMessage):
                     image[key] = getattr(self, key, default)                              
         return str(image)
 
-    def mergemessage(self, message):
-        """ parse OueueMessage in Model vars """
+    def mergemessage(self, message, parse=True):
+        """ parse OueueMessage in Model vars, 
+            parse=False merges only the message metadata e.g. of a sent message with content taken from the model
+        """
         if isinstance(message, QueueMessage):
             """ merge queue message vars """
             for key, value in vars(message).items():
                 if not value is None:
                     setattr(self, key, value)
-                    if (key == 'content'):
+                    if (key == 'content') and parse:
                         content = literal_eval(message.content)
                         for metakey, metavalue in content.items():
                             default = getattr(self, metakey, None)
@@ -102,15 +105,24 @@ class StorageQueueContext():
         - AZURE_KEY_IDENTIFIER
         - AZURE_SECRET_KEY
         - AZURE_STORAGE_IS_EMULATED
+        Optional setting is:
+        - AZURE_STORAGE_POOL_SIZE (connections per pooled http session)
+
+        put_many sends messages concurrently, use max_workers up to AZURE_STORAGE_POOL_SIZE
     """
 
     _account = None
     _account_name = ''
     _account_key = ''
     _is_emulated = False
+    _requestsession = None
+    _queueservices = {}
 
     _modeldefinitions = []
+    _modelindex = {}
+    _queueindex = {}
     REGISTERED = True
+    MAX_MESSAGES = 32
 
     """ decorators """
     def get_modeldefinition(registered=False):
@@ -118,23 +130,20 @@ class StorageQueueContext():
             @wraps(func)
             def wrapper(self, storagemodel, modeldefinition=None, *args, **kwargs):
 
-                """ modeldefinition already determined """
-                if not modeldefinition is None:
-                    return func(self, storageobject, modeldefinition, *args, **kwargs)
+                """ modeldefinition already determined, other values are the first positional argument of func e.g. get_many(model, 10) """
+                if isinstance(modeldefinition, dict):
+                    return func(self, storagemodel, modeldefinition, *args, **kwargs)
+                elif not modeldefinition is None:
+                    args = (modeldefinition,) + args
+                    modeldefinition = None
             
                 """ find modeldefinition for StorageQueueModel or StorageQueueModel """
                 if isinstance(storagemodel, StorageQueueModel):
-                    definitionlist = [definition for definition in self._modeldefinitions if definition['modelname'] == storagemodel.__class__.__name__]
+                    modeldefinition = self._modelindex.get(storagemodel.__class__, None)
                 else:
                     log.info('Argument is not an StorageQueueModel')
                     raise Exception("Argument is not an StorageQueueModel")
                 
-                if len(definitionlist) == 1:
-                    modeldefinition = definitionlist[0]
-
-                elif len(definitionlist) > 1:
-                    raise Exception("multiple registration for model")
-
                 if registered and (not isinstance(modeldefinition, dict)):
                     raise Exception("Please register Model first")
 
@@ -163,9 +172,43 @@ class StorageQueueContext():
         else:
             raise AzureException
 
-        """ registered models """
+        """ pooled http session shared per storage account and services per encryption configuration """
+        self._requestsession = get_request_session(self._account, kwargs.get('AZURE_STORAGE_POOL_SIZE', DEFAULT_POOL_SIZE))
+        self._queueservices = {}
+
+        """ registered models and indexes by model class and queue name """
         self._modeldefinitions = []
+        self._modelindex = {}
+        self._queueindex = {}
  
+    def __queueservice__(self, encrypt) -> QueueService:
+        """ return the QueueService shared by all models with the same encryption configuration """
+        queueservice = self._queueservices.get(encrypt, None)
+
+        if queueservice is None:
+            queueservice = self._account.create_queue_service()
+            queueservice.request_session = self._requestsession
+
+            if encrypt:
+
+                # Create the KEK used for encryption.
+                # KeyWrapper is the provided sample implementation, but the user may use their own object as long as it implements the interface above.
+                kek = KeyWrapper(self._key_identifier, self._secret_key) #  Key identifier
+
+                # Create the key resolver used for decryption.
+                # KeyResolver is the provided sample implementation, but the user may use whatever implementation they choose so long as the function set on the service object behaves appropriately.
+                key_resolver = KeyResolver()
+                key_resolver.put_key(kek)                           
+
+                # Set the require Encryption, KEK and key resolver on the service object.
+                queueservice.require_encryption = True
+                queueservice.key_encryption_key = kek
+                queueservice.key_resolver_function = key_resolver.resolve_key
+
+            self._queueservices[encrypt] = queueservice
+
+        return queueservice
+
     def __create__(self, modeldefinition:dict) -> bool:
         if (not modeldefinition['queueservice'] is None):
             try:
@@ -205,7 +248,7 @@ class StorageQueueContext():
         if modeldefinition is None:
             
             """ test if queuename already exists """
-            if [model for model in self._modeldefinitions if model['queuename'] == storagemodel._queuename]:
+            if storagemodel._queuename in self._queueindex:
                 raise NameConventionError(storagemodel._queuename)
 
             """ test if queuename fits to azure naming rules """
@@ -215,31 +258,17 @@ class StorageQueueContext():
             """ now register model """
             modeldefinition = {
                 'modelname': storagemodel.__class__.__name__,
+                'modelclass': storagemodel.__class__,
                 'queuename': storagemodel._queuename,
                 'encrypt': storagemodel._encrypt,
-                'queueservice': self._account.create_queue_service()
+                'queueservice': self.__queueservice__(storagemodel._encrypt)
                 }    
 
-            """ encrypt queue service """
-            if modeldefinition['encrypt']:
-
-                # Create the KEK used for encryption.
-                # KeyWrapper is the provided sample implementation, but the user may use their own object as long as it implements the interface above.
-                kek = KeyWrapper(self._key_identifier, self._secret_key) #  Key identifier
-
-                # Create the key resolver used for decryption.
-                # KeyResolver is the provided sample implementation, but the user may use whatever implementation they choose so long as the function set on the service object behaves appropriately.
-                key_resolver = KeyResolver()
-                key_resolver.put_key(kek)                           
-
-                # Set the require Encryption, KEK and key resolver on the service object.
-                modeldefinition['queueservice'].require_encryption = True
-                modeldefinition['queueservice'].key_encryption_key = kek
-                modeldefinition['queueservice'].key_resolver_funcion = key_resolver.resolve_key
-            
             self.__create__(modeldefinition)
                 
             self._modeldefinitions.append(modeldefinition)
+            self._modelindex[modeldefinition['modelclass']] = modeldefinition
+            self._queueindex[modeldefinition['queuename']] = modeldefinition
 
             log.info('model {} registered successfully. Models are {!s}.'.format(modeldefinition['modelname'], [model['modelname'] for model in self._modeldefinitions]))
         else:
@@ -260,10 +289,9 @@ class StorageQueueContext():
         """
         
         """ remove from modeldefinitions """
-        for i in range(len(self._modeldefinitions)):
-            if self._modeldefinitions[i]['modelname'] == modeldefinition['modelname']:
-                del self._modeldefinitions[i]
-                break
+        self._modeldefinitions.remove(modeldefinition)
+        del self._modelindex[modeldefinition['modelclass']]
+        del self._queueindex[modeldefinition['queuename']]
 
         """ delete queue from storage if delete_queue == True """        
         if delete_queue:
@@ -277,7 +305,7 @@ class StorageQueueContext():
         """ insert queue message into storage """
         try:
             message = modeldefinition['queueservice'].put_message(storagemodel._queuename, storagemodel.getmessage())
-            storagemodel.mergemessage(message)
+            storagemodel.mergemessage(message, parse=False)
 
         except Exception as e:
             storagemodel = None
@@ -287,6 +315,37 @@ class StorageQueueContext():
         finally:
             return storagemodel
 
+    @get_modeldefinition(REGISTERED)
+    def __putmessage__(self, storagemodel:object, modeldefinition = None) -> StorageQueueModel:
+        """ insert one queue message, raises on failure """
+        message = modeldefinition['queueservice'].put_message(storagemodel._queuename, storagemodel.getmessage())
+        storagemodel.mergemessage(message, parse=False)
+        return storagemodel
+
+    def put_many(self, storagemodels, max_workers=DEFAULT_POOL_SIZE) -> list:
+        """ insert queue messages concurrently on a bounded thread pool sharing the pooled http session
+
+            returns the models in given order. If any message can not be saved BulkOperationError is raised
+            after all messages are sent with .results (None for failed messages) and .errors [(index, exception)]
+        """
+        storagemodels = list(storagemodels)
+        results = [None] * len(storagemodels)
+        errors = []
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(storagemodels)))) as executor:
+            futures = [executor.submit(self.__putmessage__, storagemodel) for storagemodel in storagemodels]
+            for index, future in enumerate(futures):
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    log.debug('can not save queue message {!s} because {!s}'.format(index, e))
+                    errors.append((index, e))
+
+        if errors:
+            raise BulkOperationError(results, errors)
+
+        return results
+
     @get_modeldefinition(REGISTERED)
     def peek(self, storagemodel:object, modeldefinition = None) -> StorageQueueModel:
         """ lookup the next message in queue """
@@ -335,6 +394,51 @@ class StorageQueueContext():
         finally:
             return storagemodel
 
+    def __messages__(self, storagemodel, modeldefinition, num_messages, hide, dequeue) -> list:
+        """ retrieve messages with at most MAX_MESSAGES per request into new instances of the class of storagemodel """
+        modelclass = storagemodel.__class__
+        storagemodels = []
+
+        try:
+            while len(storagemodels) < num_messages:
+                count = min(num_messages - len(storagemodels), self.MAX_MESSAGES)
+                if not dequeue:
+                    messages = modeldefinition['queueservice'].peek_messages(storagemodel._queuename, num_messages=count)
+                elif hide > 0:
+                    messages = modeldefinition['queueservice'].get_messages(storagemodel._queuename, num_messages=count, visibility_timeout = hide)
+                else:
+                    messages = modeldefinition['queueservice'].get_messages(storagemodel._queuename, num_messages=count)
+
+                """ parse retrieved messages """
+                for message in messages:
+                    retrieved = modelclass()
+                    retrieved.mergemessage(message)
+                    storagemodels.append(retrieved)
+
+                """ queue drained ? """
+                if len(messages) < count:
+                    break
+
+        except Exception as e:
+            msg = 'can not {} queue messages:  queue {} because {!s}'.format('get' if dequeue else 'peek', storagemodel._queuename, e)
+            raise AzureStorageWrapException(msg=msg)
+
+        return storagemodels
+
+    @get_modeldefinition(REGISTERED)
+    def peek_many(self, storagemodel:object, modeldefinition = None, num_messages = MAX_MESSAGES) -> list:
+        """ lookup the next messages in queue in one request, peek returns at most MAX_MESSAGES (32) messages
+            returns a list of instances of the class of storagemodel (empty if there is no message)
+        """
+        return self.__messages__(storagemodel, modeldefinition, min(num_messages, self.MAX_MESSAGES), 0, False)
+
+    @get_modeldefinition(REGISTERED)
+    def get_many(self, storagemodel:object, modeldefinition = None, num_messages = MAX_MESSAGES, hide = 0) -> list:
+        """ get the next num_messages messages in queue, dequeued with up to MAX_MESSAGES (32) messages per request
+            returns a list of instances of the class of storagemodel (empty if there is no message)
+        """
+        return self.__messages__(storagemodel, modeldefinition, num_messages, hide, True)
+
     @get_modeldefinition(REGISTERED)
     def update(self, storagemodel:object, modeldefinition = None, hide = 0) -> StorageQueueModel:
         """ update the message in queue """
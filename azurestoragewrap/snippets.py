@@ -1,6 +1,16 @@
 """ imports & globals """
 import datetime
 import re
+import threading
+import itertools
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 25
+
+_requestsessions = {}
+_requestsessionslock = threading.Lock()
 
 """ snippets """
 def safe_cast(val, to_type, default=None, dformat=''):
@@ -50,3 +60,30 @@ def test_azurestorage_nameconventions(storageobjectname, storageobjecttype):
     pass
 
 
+def get_request_session(account, pool_size=DEFAULT_POOL_SIZE):
+    """ return one pooled requests.Session per storage account and pool size
+        shared by all table, queue and blob services so connections and tls sessions are reused
+    """
+    key = (account.account_name, account.is_emulated, pool_size)
+    with _requestsessionslock:
+        session = _requestsessions.get(key, None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _requestsessions[key] = session
+    return session
+
+def keyspace_ranges(count=16, alphabet='0123456789abcdef') -> list:
+    """ split the key space of keys beginning with characters of alphabet (e.g. hex digits of uuids) into count ranges (low, high),
+        low inclusive and high exclusive. The first range starts and the last range ends with None, so keys outside of alphabet are covered as well
+    """
+    alphabet = sorted(set(alphabet))
+    length = 1
+    while len(alphabet) ** length < count:
+        length += 1
+
+    prefixes = [''.join(prefix) for prefix in itertools.product(alphabet, repeat=length)]
+    bounds = [prefixes[(len(prefixes) * index) // count] for index in range(1, count)]
+    return list(zip([None] + bounds, bounds + [None]))
@@ -1,14 +1,30 @@
 """ imports & globals """
-from azure.common import AzureMissingResourceHttpError, AzureException
+from azure.common import AzureMissingResourceHttpError, AzureConflictHttpError, AzureHttpError, AzureException
 from azure.storage import CloudStorageAccount
-from azure.storage.table import TableService, Entity
+from azure.storage.table import TableService, Entity, TableBatch, EntityProperty
 
 
 import datetime
-from functools import wraps
+import time
+import uuid
+import threading
+import queue
+import atexit
+import asyncio
+from collections import OrderedDict
+from functools import wraps, partial
+from bisect import bisect_left, bisect_right
+from types import FunctionType
+from concurrent.futures import ThreadPoolExecutor
+
+""" optional numpy for columnar exports """
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 """ helpers """
-from azurestoragewrap.snippets import safe_cast, test_azurestorage_nameconventions
+from azurestoragewrap.snippets import safe_cast, test_azurestorage_nameconventions, get_request_session, keyspace_ranges, DEFAULT_POOL_SIZE
 
 """ encryption """
 from azurestoragewrap.encryption import (
@@ -17,13 +33,23 @@ from azurestoragewrap.encryption import (
     )
 
 """ custom Exceptions """
-from azurestoragewrap.exception import  AzureStorageWrapException, NameConventionError, ModelNotRegisteredError, ModelRegisteredMoreThanOnceError
+from azurestoragewrap.exception import  AzureStorageWrapException, NameConventionError, ModelNotRegisteredError, ModelRegisteredMoreThanOnceError, BulkOperationError, EntityConflictError
 
 """ logging """
 import logging
 log = logging.getLogger('azurestoragewrap')
 
 """ model base classes """
+ENTITY_TYPES = (str, int, bool, datetime.date, datetime.datetime)
+METHOD_TYPES = (FunctionType, staticmethod, classmethod, property)
+NUMPY_TYPES = {int: 'int64', float: 'float64', bool: 'bool', datetime.datetime: 'datetime64[us]', datetime.date: 'datetime64[D]'}
+
+def entityvalue(value):
+    """ plain value of a queried entity property, the sdk returns Int32 and binary properties as EntityProperty """
+    if isinstance(value, EntityProperty):
+        return value.value
+    return value
+
 class PartitionKey(object):
     def __init__(self, default):
         self._default = default
@@ -39,78 +65,200 @@ class EncryptKey(object):
         self._default = default
         self._type = type(default)
 
-class StorageTableModel(object):
-    _tablename = ''
-    _encrypt = []
-    _dateformat = ''
-    _datetimeformat = ''
-    _exists = None
-
-    _PartitionKey = ''
-    _RowKey = ''
-
-    def __init__(self, **kwargs):                  
-        """ constructor """
-        
-        self._tablename = self.__class__._tablename
-        if self._tablename == '':
-            self._tablename = self.__class__.__name__
-        self._dateformat = self.__class__._dateformat
-        self._datetimeformat = self.__class__._datetimeformat
-        self._exists = None
-        self._encrypt = []
-
-        IncludeRelationship = []
-               
-        """ parse **kwargs into instance var """
-        for key, default in vars(self.__class__).items():
-            if not key.startswith('_') and key != '':
+class StorageTableSchema(object):
+    """ compiled definition of a StorageTableModel class
+        determined once per class instead of scanning vars() for every instance
+    """
+    def __init__(self, modelclass, attributes=None):
+        if attributes is None:
+            attributes = vars(modelclass)
+
+        self.compact = getattr(modelclass, '_compact', False)
+        self.tablename = modelclass._tablename
+        if self.tablename == '':
+            self.tablename = modelclass.__name__
+        self.dateformat = modelclass._dateformat
+        self.datetimeformat = modelclass._datetimeformat
+
+        self.partitionkey = ''
+        self.rowkey = ''
+        self.encrypt = []
+        self.fields = []
+        self.relationships = []
+        self.properties = []
+        self.defaults = {}
+
+        for key, default in attributes.items():
+            if not key.startswith('_') and key != '' and not isinstance(default, METHOD_TYPES):
 
                 to_type = type(default)
-                
+
                 if to_type is PartitionKey:
-                    self._PartitionKey = key
+                    self.partitionkey = key
                     to_type = default._type
                     default = default._default
 
                 elif to_type is RowKey:
-                    self._RowKey = key
+                    self.rowkey = key
                     to_type = default._type
                     default = default._default
 
                 elif to_type is EncryptKey:
-                    self._encrypt.append(key)
+                    self.encrypt.append(key)
                     to_type = default._type
                     default = default._default
 
-                value = kwargs.get(key, default)
-                
                 if to_type is StorageTableQuery:
-                    setattr(self, key, value)
-                    IncludeRelationship.append({'key': key, 
-                                                'query': value})
+                    self.relationships.append(key)
+                    dformat = ''
 
                 elif to_type is datetime.datetime:
-                    setattr(self, key, safe_cast(value, to_type, default, self._datetimeformat))
+                    dformat = self.datetimeformat
 
                 elif to_type is datetime.date:
-                    setattr(self, key, safe_cast(value, to_type, default, self._dateformat))
+                    dformat = self.dateformat
 
                 else:
-                    setattr(self, key, safe_cast(value, to_type, default))
+                    dformat = ''
+
+                self.fields.append((key, to_type, default, dformat))
+                self.defaults[key] = default
+
+                """ properties stored in table entities """
+                if (to_type is not StorageTableQuery) and (key not in ['PartitionKey','RowKey']):
+                    self.properties.append(key)
+
+
+class StorageTableModelMeta(type):
+    """ compile model schema once per class 
+        models with _compact = True get generated __slots__ and share their metadata on class level
+    """
+    instanceslots = ('_exists', '_loaded', '_etag')
+
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        compact = namespace.get('_compact', False)
+        if compact:
+            fields = [key for key, default in namespace.items() if not key.startswith('_') and key != '' and not isinstance(default, METHOD_TYPES)]
+            classnamespace = {key: value for key, value in namespace.items() if not key in fields}
+            classnamespace['__slots__'] = tuple(fields) + mcs.instanceslots
+        else:
+            classnamespace = namespace
+
+        cls = super().__new__(mcs, name, bases, classnamespace, **kwargs)
+        cls._schema = StorageTableSchema(cls, namespace)
+
+        if compact:
+            cls._tablename = cls._schema.tablename
+            cls._encrypt = cls._schema.encrypt
+            if cls._schema.partitionkey != '':
+                cls._PartitionKey = cls._schema.partitionkey
+            if cls._schema.rowkey != '':
+                cls._RowKey = cls._schema.rowkey
+
+        return cls
+
+
+class StorageTableModel(object, metaclass=StorageTableModelMeta):
+    __slots__ = ()
+
+    _tablename = ''
+    _encrypt = []
+    _dateformat = ''
+    _datetimeformat = ''
+    _exists = None
+    _etag = None
+    _schema = None
+    _compact = False
+
+    _PartitionKey = ''
+    _RowKey = ''
+
+    def __init__(self, **kwargs):                  
+        """ constructor """
+        schema = self.__class__._schema
+        
+        if not schema.compact:
+            self._tablename = schema.tablename
+            self._dateformat = schema.dateformat
+            self._datetimeformat = schema.datetimeformat
+            self._encrypt = schema.encrypt
 
+            if schema.partitionkey != '':
+                self._PartitionKey = schema.partitionkey
+            if schema.rowkey != '':
+                self._RowKey = schema.rowkey
+
+        self._exists = None
+        self._etag = kwargs.get('etag', None)
+        self._loaded = schema.defaults
+               
+        """ parse **kwargs into instance var """
+        for key, to_type, default, dformat in schema.fields:
+            value = kwargs.get(key, default)
+            if type(value) is to_type:
+                setattr(self, key, value)
+            else:
+                setattr(self, key, safe_cast(value, to_type, default, dformat))
+
+        self.__relationships__()
+
+    @classmethod
+    def fromentity(cls, entity):
+        """ fast construction of a loaded model from a queried entity:
+            values of the wire type of a property (EntityProperty unwrapped) are taken as they are (no safe_cast), key properties missing in
+            the entity are taken from PartitionKey/ RowKey and the loaded values are the snapshot for delta()
+        """
+        schema = cls._schema
+        self = cls.__new__(cls)
+
+        if not schema.compact:
+            self._tablename = schema.tablename
+            self._dateformat = schema.dateformat
+            self._datetimeformat = schema.datetimeformat
+            self._encrypt = schema.encrypt
+
+            if schema.partitionkey != '':
+                self._PartitionKey = schema.partitionkey
+            if schema.rowkey != '':
+                self._RowKey = schema.rowkey
+
+        self._exists = True
+        self._etag = entity.get('etag', None)
+
+        loaded = {}
+        for key, to_type, default, dformat in schema.fields:
+            if key in entity:
+                value = entity[key]
+            elif key == schema.partitionkey:
+                value = entity.get('PartitionKey', default)
+            elif key == schema.rowkey:
+                value = entity.get('RowKey', default)
+            else:
+                value = default
+
+            value = entityvalue(value)
+            if type(value) is not to_type:
+                value = safe_cast(value, to_type, default, dformat)
+            setattr(self, key, value)
+            loaded[key] = value
+        self._loaded = loaded
+
+        self.__relationships__()
+        return self
+
+    def __relationships__(self):
         """ initialize Relationship/ related Query Objects """
-        for item in IncludeRelationship:
-            key = item['key']
-            query = item['query']
+        for key in self.__class__._schema.relationships:
+            query = getattr(self, key)
             pkwhere = getattr(self, query._pkforeignkey, '*')
             rkwhere = getattr(self, query._rkforeignkey, '*') 
             setattr(self, key, StorageTableQuery(query._storagemodel,
                                                  query._pkcondition,
                                                  pkwhere,
                                                  query._rkcondition,
-                                                 rkwhere))
-                                                 #, query._select))
+                                                 rkwhere,
+                                                 query._select,
+                                                 query._where))
 
 
     # Define the encryption resolver_function.
@@ -126,18 +274,147 @@ class StorageTableModel(object):
         image = {}
         image['PartitionKey'] = self.getPartitionKey()
         image['RowKey'] = self.getRowKey()
-        for key, value in vars(self).items():
-            if not key.startswith('_') and key not in ['','PartitionKey','RowKey']:
-                if type(value) in [str, int, bool, datetime.date, datetime.datetime]:
-                    image[key] = value                    
+        for key in self.__class__._schema.properties:
+            value = getattr(self, key, None)
+            if type(value) in ENTITY_TYPES:
+                image[key] = value                    
         return image
 
+    def delta(self) -> dict:
+        """ parse properties changed since construction (compared to their defaults) or since last load/ save into dictionary """
+        image = {}
+        image['PartitionKey'] = self.getPartitionKey()
+        image['RowKey'] = self.getRowKey()
+        loaded = self._loaded
+        for key in self.__class__._schema.properties:
+            value = getattr(self, key, None)
+            if type(value) in ENTITY_TYPES and value != loaded.get(key):
+                image[key] = value
+        return image
+
+    def cleardelta(self):
+        """ mark all properties as unchanged e.g. after loading or saving the entity """
+        self._loaded = {key: getattr(self, key, None) for key in self.__class__._schema.properties}
+
     def getPartitionKey(self) -> str:
         return str(getattr(self, self._PartitionKey))
 
     def getRowKey(self) -> str:
         return str(getattr(self, self._RowKey))
  
+class StorageTableFilter(object):
+    """ composable filter expression, compiles to an escaped OData $filter string by str()
+
+        build expressions by comparing a StorageTableProperty with a value and combine them with & (and), | (or) and ~ (not):
+        (StorageTableProperty('PartitionKey') == 1) & (StorageTableProperty('beginn') >= datetime.datetime(2018, 1, 1))
+    """
+    def __init__(self, expression=''):
+        self._expression = expression
+
+    @staticmethod
+    def literal(value) -> str:
+        """ format value as typed OData literal """
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        elif isinstance(value, int):
+            if value >= 2**31 or value < -(2**31):
+                return '{!s}L'.format(value)
+            return '{!s}'.format(value)
+        elif isinstance(value, float):
+            return repr(value)
+        elif isinstance(value, datetime.datetime):
+            if not value.tzinfo is None:
+                value = value.astimezone(datetime.timezone.utc)
+            return "datetime'{!s}'".format(value.strftime('%Y-%m-%dT%H:%M:%S.%fZ'))
+        elif isinstance(value, datetime.date):
+            return "datetime'{!s}'".format(value.strftime('%Y-%m-%dT00:00:00.000000Z'))
+        elif isinstance(value, uuid.UUID):
+            return "guid'{!s}'".format(value)
+        elif isinstance(value, bytes):
+            return "X'{!s}'".format(value.hex())
+        else:
+            return "'{!s}'".format(str(value).replace("'", "''"))
+
+    def __combine__(self, operator, other):
+        if not isinstance(other, StorageTableFilter):
+            other = StorageTableFilter(str(other))
+        if self._expression == '':
+            return other
+        if other._expression == '':
+            return self
+        return StorageTableFilter('({!s}) {!s} ({!s})'.format(self._expression, operator, other._expression))
+
+    def __and__(self, other):
+        return self.__combine__('and', other)
+
+    def __or__(self, other):
+        return self.__combine__('or', other)
+
+    def __invert__(self):
+        if self._expression == '':
+            return self
+        return StorageTableFilter('not ({!s})'.format(self._expression))
+
+    def __str__(self):
+        return self._expression
+
+    def __repr__(self):
+        return 'StorageTableFilter({!r})'.format(self._expression)
+
+
+class StorageTableProperty(object):
+    """ reference a model property (or PartitionKey, RowKey) in a StorageTableFilter, comparisons return StorageTableFilter
+        values compared with PartitionKey or RowKey are always strings
+    """
+    def __init__(self, name):
+        self._name = name
+
+    def __compare__(self, operator, value) -> StorageTableFilter:
+        if self._name in ['PartitionKey', 'RowKey']:
+            value = str(value)
+        return StorageTableFilter('{!s} {!s} {!s}'.format(self._name, operator, StorageTableFilter.literal(value)))
+
+    def __eq__(self, value):
+        return self.__compare__('eq', value)
+
+    def __ne__(self, value):
+        return self.__compare__('ne', value)
+
+    def __lt__(self, value):
+        return self.__compare__('lt', value)
+
+    def __le__(self, value):
+        return self.__compare__('le', value)
+
+    def __gt__(self, value):
+        return self.__compare__('gt', value)
+
+    def __ge__(self, value):
+        return self.__compare__('ge', value)
+
+    __hash__ = object.__hash__
+
+    def between(self, low, high) -> StorageTableFilter:
+        """ low <= property < high """
+        return (self >= low) & (self < high)
+
+    def startswith(self, prefix) -> StorageTableFilter:
+        """ range over all strings beginning with prefix e.g. RowKeys of a composed key """
+        prefix = str(prefix)
+        if prefix == '':
+            return StorageTableFilter()
+        return self.between(prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+def indexmutation(method):
+    """ wrap a list method that changes the result set of a StorageTableQuery to drop its indexes """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._hashindexes = {}
+        self._sortedindexes = {}
+        return method(self, *args, **kwargs)
+    return wrapper
+
 class StorageTableQuery(list):
     """ Initialized a query your azure storage to implement a model relationship by Partition- and/or RowKey
 
@@ -145,37 +422,43 @@ class StorageTableQuery(list):
         - storagemodel: StorageTableModel (Object)
         - pkfilter: str (where clause for PartitionKey)
         - rkfilter: str (where clause for RowKeyFilter)
-        - Select: list (define a subset of fields to query) 
+        - select: list (define a subset of fields to query) 
+        - where: StorageTableFilter (additional conditions on any property, see where())
 
     """
     _storagemodel = None
     _select = None
+    _where = None
+    _indexkeys = frozenset()
+    _hashindexes = {}
+    _sortedindexes = {}
     _queryfilter = ''
     _pkcondition = ''
     _rkcondition = ''
     _pkforeignkey= ''
     _rkforeignkey= ''    
 
-    def __init__(self, storagemodel=None, pkcondition='', pkforeignkey = '', rkcondition = '', rkforeignkey=''):
+    def __init__(self, storagemodel=None, pkcondition='', pkforeignkey = '', rkcondition = '', rkforeignkey='', select=None, where=None):
 
         """ set storagemodel """
         self._storagemodel = storagemodel
+        self._hashindexes = {}
+        self._sortedindexes = {}
         
-        """ set select """
+        """ parse select statement into self._select """
         self._select = None
-
-        """ 
-        to be done: parse select statement into self._select 
-            if (isinstance(select,list)) and (select != []) and (not self._storagemodel is None):
-                self._select = ''
-                for key in select:
-                    if key in vars(self._storagemodel):
-                        if (self._select != ''):
-                            self._select += ', '
-                        self._select += key
-            else:
-                self._select = None
-        """
+        if isinstance(select, str):
+            select = [key.strip() for key in select.split(',') if key.strip() != '']
+
+        if (isinstance(select, list)) and (select != []) and (not self._storagemodel is None):
+            properties = self._storagemodel._schema.properties
+            selectlist = []
+            for key in ['PartitionKey', 'RowKey', self._storagemodel._PartitionKey, self._storagemodel._RowKey] + select:
+                if not key in properties + ['PartitionKey', 'RowKey']:
+                    raise AzureStorageWrapException(self._storagemodel, 'can not select {!s} because it is not a property of model {!s}'.format(key, self._storagemodel.__class__.__name__))
+                if not key in selectlist:
+                    selectlist.append(key)
+            self._select = ','.join(selectlist)
            
         """ query configuration """
         self._pkcondition = pkcondition
@@ -186,28 +469,343 @@ class StorageTableQuery(list):
         
         """ determine query filter """
         if self._pkcondition != '' and self._pkforeignkey !='':
-            self._queryfilter = "PartitionKey {!s} '{!s}'".format(self._pkcondition, self._pkforeignkey)
+            self._queryfilter = "PartitionKey {!s} {!s}".format(self._pkcondition, StorageTableFilter.literal(str(self._pkforeignkey)))
 
         if self._rkcondition != '' and self._rkforeignkey !='':
             if self._queryfilter != '':
                 self._queryfilter += ' and '
 
-            self._queryfilter += "RowKey {!s} '{!s}'".format(self._rkcondition, self._rkforeignkey)
+            self._queryfilter += "RowKey {!s} {!s}".format(self._rkcondition, StorageTableFilter.literal(str(self._rkforeignkey)))
+
+        self._where = None
+        if not where is None:
+            self.where(where)
         pass
 
+    def where(self, expression):
+        """ add conditions (StorageTableFilter) to the query filter, returns self to chain calls
+
+            query = StorageTableQuery(TableOne()).where((StorageTableProperty('PartitionKey') == 1) & StorageTableProperty('RowKey').startswith('2018'))
+        """
+        if not isinstance(expression, StorageTableFilter):
+            expression = StorageTableFilter(str(expression))
+
+        self._where = expression if self._where is None else (self._where & expression)
+        self._queryfilter = str(StorageTableFilter(self._queryfilter) & expression)
+        return self
+
+    """ result set changes drop the indexes """
+    append = indexmutation(list.append)
+    extend = indexmutation(list.extend)
+    insert = indexmutation(list.insert)
+    remove = indexmutation(list.remove)
+    pop = indexmutation(list.pop)
+    clear = indexmutation(list.clear)
+    sort = indexmutation(list.sort)
+    reverse = indexmutation(list.reverse)
+    __setitem__ = indexmutation(list.__setitem__)
+    __delitem__ = indexmutation(list.__delitem__)
+    __iadd__ = indexmutation(list.__iadd__)
+    __imul__ = indexmutation(list.__imul__)
+
+    def create_index(self, *keys):
+        """ opt in to indexes on properties used by find and filter, returns self to chain calls
+            a hash index (eq) and a sorted index (lt, le, gt, ge) per key are built lazily on the first lookup 
+            and dropped when the result set changes. Changes of the entities themselves are not tracked.
+        """
+        self._indexkeys = self._indexkeys | frozenset(keys)
+        return self
+
+    def __value__(self, item, key):
+        """ property value of an entity or model, StorageTableCache.MISSING if it has none """
+        if isinstance(item, dict):
+            return item.get(key, StorageTableCache.MISSING)
+        value = getattr(item, key, StorageTableCache.MISSING)
+        if (value is StorageTableCache.MISSING) and (key == 'PartitionKey'):
+            value = item.getPartitionKey()
+        elif (value is StorageTableCache.MISSING) and (key == 'RowKey'):
+            value = item.getRowKey()
+        return value
+
+    def __hashindex__(self, key) -> dict:
+        """ value -> positions of the entities in self """
+        if not key in self._hashindexes:
+            index = {}
+            for position, item in enumerate(self):
+                value = self.__value__(item, key)
+                if not value is StorageTableCache.MISSING:
+                    index.setdefault(value, []).append(position)
+            self._hashindexes[key] = index
+        return self._hashindexes[key]
+
+    def __sortedindex__(self, key) -> tuple:
+        """ sorted values and the positions of the entities in self """
+        if not key in self._sortedindexes:
+            pairs = [(value, position) for value, positions in self.__hashindex__(key).items() for position in positions]
+            pairs.sort(key=lambda pair: pair[0])
+            self._sortedindexes[key] = ([value for value, position in pairs], [position for value, position in pairs])
+        return self._sortedindexes[key]
+
     def find(self, key, condition) -> list:
-        """ find a subset of Entities that fits to condition
-        
-            ! to be done !
+        """ find a subset of Entities that fits to condition, in order of the result set
+            condition is a value (equal) or a tuple (operator, value) with operator 'eq', 'ne', 'lt', 'le', 'gt' or 'ge'
+            lookups on keys with create_index are O(1) (eq) or O(log n) (lt, le, gt, ge) plus the found entities
         """
-        pass
+        operator, value = condition if isinstance(condition, tuple) else ('eq', condition)
+
+        if (not key in self._indexkeys) or (operator == 'ne'):
+            compare = {'eq': lambda x: x == value, 'ne': lambda x: x != value, 
+                       'lt': lambda x: x < value, 'le': lambda x: x <= value, 
+                       'gt': lambda x: x > value, 'ge': lambda x: x >= value}[operator]
+            values = [(item, self.__value__(item, key)) for item in self]
+            return [item for item, itemvalue in values if (not itemvalue is StorageTableCache.MISSING) and compare(itemvalue)]
+
+        if operator == 'eq':
+            positions = self.__hashindex__(key).get(value, [])
+        else:
+            values, positions = self.__sortedindex__(key)
+            if operator == 'lt':
+                positions = positions[:bisect_left(values, value)]
+            elif operator == 'le':
+                positions = positions[:bisect_right(values, value)]
+            elif operator == 'gt':
+                positions = positions[bisect_right(values, value):]
+            elif operator == 'ge':
+                positions = positions[bisect_left(values, value):]
+            positions = sorted(positions)
+
+        return [self[position] for position in positions]
+
+    def __columntypes__(self) -> OrderedDict:
+        """ column names (selected properties or all) with the property types of the model schema """
+        types = OrderedDict([('PartitionKey', str), ('RowKey', str)])
+        for key, to_type, default, dformat in self._storagemodel._schema.fields:
+            if not to_type is StorageTableQuery:
+                types[key] = to_type
+        if (not self._select is None) and (self._select != ''):
+            types = OrderedDict([(key, types[key]) for key in self._select.split(',')])
+        return types
+
+    def __appendcolumns__(self, columns, entities):
+        """ append the values of entities (defaults for missing properties) cast to the schema types to the column lists """
+        schema = self._storagemodel._schema
+        types = self.__columntypes__()
+        formats = {key: dformat for key, to_type, default, dformat in schema.fields}
+        for key, column in columns.items():
+            default = schema.defaults.get(key, '')
+            to_type = types.get(key, str)
+            for entity in entities:
+                if isinstance(entity, dict):
+                    value = entityvalue(entity.get(key, default))
+                else:
+                    value = self.__value__(entity, key)
+                    if value is StorageTableCache.MISSING:
+                        value = default
+                if isinstance(value, datetime.datetime) and (not value.tzinfo is None):
+                    value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+                if type(value) is not to_type:
+                    value = safe_cast(value, to_type, default, formats.get(key, ''))
+                column.append(value)
+        return columns
+
+    def to_columns(self) -> OrderedDict:
+        """ export the entities of the result set as columns {property: [values]} """
+        return self.__appendcolumns__(OrderedDict([(key, []) for key in self.__columntypes__()]), self)
+
+    def to_numpy(self, columns=None) -> OrderedDict:
+        """ export the entities of the result set (or columns of to_columns/ StorageTableContext.query_columns) as typed numpy arrays 
+            {property: numpy.ndarray} with datetime64, int64, float64, bool or object (str) dtype by the model schema. Requires numpy.
+        """
+        if numpy is None:
+            raise AzureStorageWrapException(self._storagemodel, 'to_numpy requires numpy, please install it e.g. by pip install azurestoragewrap[numpy]')
+
+        if columns is None:
+            columns = self.to_columns()
+
+        types = self.__columntypes__()
+        return OrderedDict([(key, numpy.array(column, dtype=NUMPY_TYPES.get(types.get(key), object))) for key, column in columns.items()])
 
     def filter(self, key, values) -> list:
-        resultset = [item for item in self if item[key] in values]
+        """ keep only entities with key in values, uses the hash index of keys with create_index """
+        if key in self._indexkeys:
+            index = self.__hashindex__(key)
+            positions = sorted([position for value in set(values) for position in index.get(value, [])])
+            resultset = [self[position] for position in positions]
+        else:
+            resultset = [item for item in self if self.__value__(item, key) in values]
         self.clear()
         self.extend(resultset)
     pass
 
+class StorageTableCache(object):
+    """ bounded, thread safe LRU cache for table entities with time to live
+        keyed by (tablename, PartitionKey, RowKey), caches missing entities as well
+    """
+    MISSING = object()
+
+    def __init__(self, maxsize=1000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """ return cached entity, MISSING for a cached not existing entity or None """
+        with self._lock:
+            item = self._entries.get(key, None)
+            if (item is None) or (item[0] < time.monotonic()):
+                if not item is None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, entity):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, entity)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize, 'ttl': self.ttl}
+
+
+class StorageTableBuffer(object):
+    """ write behind buffer for inserts, collects models per table and PartitionKey and a background thread inserts
+        or replaces them in entity group transactions as soon as a partition holds MAX_BATCH_SIZE models or its
+        oldest model waited maxage seconds. put blocks while maxsize models are buffered (backpressure).
+        buffered models are written on flush, close and at interpreter exit
+    """
+    def __init__(self, context, maxsize=10000, maxage=1.0):
+        self.maxsize = maxsize
+        self.maxage = maxage
+        self.committed = 0
+        self.failed = 0
+        self._context = context
+        self._partitions = OrderedDict()
+        self._size = 0
+        self._flushing = 0
+        self._flushall = False
+        self._closed = False
+        self._lock = threading.Condition()
+        self._thread = threading.Thread(target=self.__run__, name='StorageTableBuffer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, storagemodel):
+        """ buffer a model, blocks while the buffer is full """
+        modeldefinition = self._context.getmodeldefinition(storagemodel, True)
+        group = (modeldefinition['tablename'], storagemodel.getPartitionKey())
+
+        with self._lock:
+            while (self._size >= self.maxsize) and (not self._closed):
+                self._lock.notify_all()
+                self._lock.wait()
+
+            if self._closed:
+                raise AzureStorageWrapException(storagemodel, 'can not buffer table entity:  Table {}, PartitionKey {}, RowKey {} because the buffer is closed'.format(modeldefinition['tablename'], storagemodel.getPartitionKey(), storagemodel.getRowKey()))
+
+            partition = self._partitions.get(group, None)
+            if partition is None:
+                partition = self._partitions[group] = (time.monotonic(), [])
+                if len(self._partitions) == 1:
+                    """ wake the background thread to wait for the expiry of the first partition """
+                    self._lock.notify_all()
+
+            partition[1].append(storagemodel)
+            self._size += 1
+            if (len(partition[1]) >= self._context.MAX_BATCH_SIZE) or (self._size >= self.maxsize):
+                self._lock.notify_all()
+
+    def __due__(self) -> list:
+        """ take the models of all full or expired partitions, everything if a flush is requested or the buffer is full """
+        flushall = self._flushall or (self._size >= self.maxsize)
+        expired = time.monotonic() - self.maxage
+        storagemodels = []
+
+        for group in list(self._partitions):
+            created, partition = self._partitions[group]
+            if flushall or (created <= expired) or (len(partition) >= self._context.MAX_BATCH_SIZE):
+                storagemodels.extend(self._partitions.pop(group)[1])
+
+        self._size -= len(storagemodels)
+        self._flushing += len(storagemodels)
+        return storagemodels
+
+    def __commit__(self, storagemodels):
+        """ insert or replace in entity group transactions, count committed and failed models """
+        try:
+            failed = len([storagemodel for storagemodel in StorageTableContext.insert_many(self._context, storagemodels) if not storagemodel._exists])
+        except Exception as e:
+            log.error('can not insert {!s} buffered table entities because {!s}'.format(len(storagemodels), e))
+            failed = len(storagemodels)
+
+        self.committed += len(storagemodels) - failed
+        self.failed += failed
+
+    def __run__(self):
+        """ background thread committing due partitions until the buffer is closed and empty """
+        with self._lock:
+            while True:
+                storagemodels = self.__due__()
+                if len(storagemodels) > 0:
+                    self._lock.release()
+                    try:
+                        self.__commit__(storagemodels)
+                    finally:
+                        self._lock.acquire()
+                    self._flushing -= len(storagemodels)
+                    self._lock.notify_all()
+                    continue
+
+                if self._size == 0:
+                    self._flushall = False
+                    if self._closed:
+                        self._lock.notify_all()
+                        break
+
+                """ sleep until the oldest partition expires or put/ flush wakes up """
+                timeout = None
+                if len(self._partitions) > 0:
+                    timeout = max(next(iter(self._partitions.values()))[0] + self.maxage - time.monotonic(), 0)
+                self._lock.wait(timeout)
+
+    def flush(self):
+        """ commit all buffered models and wait until they are written """
+        with self._lock:
+            self._flushall = True
+            self._lock.notify_all()
+            while (self._size > 0 or self._flushing > 0) and self._thread.is_alive():
+                self._lock.wait()
+
+    def close(self):
+        """ flush the buffer and stop the background thread, further puts raise AzureStorageWrapException """
+        with self._lock:
+            self._closed = True
+            self._flushall = True
+            self._lock.notify_all()
+
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def info(self) -> dict:
+        return {'size': self._size, 'maxsize': self.maxsize, 'maxage': self.maxage, 'committed': self.committed, 'failed': self.failed}
+
+
 """ wrapper classes """
 class StorageTableContext():
     """Initializes the repository with the specified settings dict.
@@ -217,6 +815,15 @@ class StorageTableContext():
         - AZURE_KEY_IDENTIFIER
         - AZURE_SECRET_KEY
         - AZURE_STORAGE_IS_EMULATED
+        Optional settings are:
+        - AZURE_STORAGE_POOL_SIZE (connections per pooled http session)
+        - AZURE_TABLE_CACHE_SIZE (cache up to n entities read by get and exists, default 0 = no cache)
+        - AZURE_TABLE_CACHE_TTL (seconds a cached entity is valid, default 60)
+        - AZURE_TABLE_BUFFER_SIZE (buffer up to n models written by insert, default 0 = no write behind buffer)
+        - AZURE_TABLE_BUFFER_AGE (seconds a buffered model waits at most, default 1)
+
+        Modeldefinitions and services are only changed by register_model and unregister_model,
+        so get, insert, merge, delete and query may be called from multiple threads (see map).
     """
     
     
@@ -226,33 +833,33 @@ class StorageTableContext():
     _is_emulated = False
     _kek = None
     _key_resolver = None
+    _requestsession = None
+    _tableservices = {}
+    _cache = None
+    _buffer = None
 
     _modeldefinitions = []
+    _modelindex = {}
+    _tableindex = {}
     REQUIRED = True
+    MAX_BATCH_SIZE = 100
+    MAX_FILTER_COMPARISONS = 15
+    MAX_FILTER_LENGTH = 4096
 
     # decorators
     def getmodeldefinition(self, storageobject, required=False):
 
         """ find modeldefinition for StorageTableModel or StorageTableQuery """
         if isinstance(storageobject, StorageTableModel):
-            definitionlist = [definition for definition in self._modeldefinitions if definition['modelname'] == storageobject.__class__.__name__]
+            modelclass = storageobject.__class__
      
         elif isinstance(storageobject, StorageTableQuery):
             """ StorageTableQuery """
-            storagemodel = storageobject._storagemodel
-            definitionlist = [definition for definition in self._modeldefinitions if definition['modelname'] == storagemodel.__class__.__name__]
+            modelclass = storageobject._storagemodel.__class__
         else:
             raise Exception("Argument is not an StorageTableModel nor an StorageTableQuery")
                                                                             
-        # is there only one modeldefinition ?
-        # hopefully!
-        modeldefinition = None
-
-        if len(definitionlist) == 1:
-            modeldefinition = definitionlist[0]
-
-        elif len(definitionlist) > 1:
-            raise ModelRegisteredMoreThanOnceError(storageobject)
+        modeldefinition = self._modelindex.get(modelclass, None)
 
         # is there a modeldefinition if required ?
         if required and modeldefinition is None:
@@ -280,8 +887,59 @@ class StorageTableContext():
         else:
             raise AzureException
 
-        """ init table model list """
+        """ pooled http session shared per storage account and table services per encryption configuration """
+        self._requestsession = get_request_session(self._account, kwargs.get('AZURE_STORAGE_POOL_SIZE', DEFAULT_POOL_SIZE))
+        self._tableservices = {}
+        self._kek = None
+        self._key_resolver = None
+
+        """ optional read through entity cache """
+        self._cache = None
+        if kwargs.get('AZURE_TABLE_CACHE_SIZE', 0) > 0:
+            self._cache = StorageTableCache(kwargs.get('AZURE_TABLE_CACHE_SIZE'), kwargs.get('AZURE_TABLE_CACHE_TTL', 60))
+
+        """ optional write behind buffer for insert """
+        self._buffer = None
+        if kwargs.get('AZURE_TABLE_BUFFER_SIZE', 0) > 0:
+            self._buffer = StorageTableBuffer(self, kwargs.get('AZURE_TABLE_BUFFER_SIZE'), kwargs.get('AZURE_TABLE_BUFFER_AGE', 1))
+
+        """ init table model list and indexes by model class and tablename """
         self._modeldefinitions = []                
+        self._modelindex = {}
+        self._tableindex = {}
+
+    def __tableservice__(self, encrypt) -> TableService:
+        """ return the TableService shared by all models with the same encryption configuration """
+        key = tuple(sorted(encrypt))
+        tableservice = self._tableservices.get(key, None)
+
+        if tableservice is None:
+            tableservice = self._account.create_table_service()
+            tableservice.request_session = self._requestsession
+
+            if encrypt:
+                """ encrypt init """
+                if self._kek is None:
+                    # Create the KEK used for encryption.
+                    # KeyWrapper is the provided sample implementation, but the user may use their own object as long as it implements the interface above.
+                    self._kek = KeyWrapper(self._key_identifier, self._secret_key) #  Key identifier
+
+                    # Create the key resolver used for decryption.
+                    # KeyResolver is the provided sample implementation, but the user may use whatever implementation they choose so long as the function set on the service object behaves appropriately.
+                    self._key_resolver = KeyResolver()
+                    self._key_resolver.put_key(self._kek)
+
+                # Create the EncryptionResolver Function to determine Properties to en/decrypt
+                encryptionresolver = self.__encryptionresolver__(list(key))
+
+                # Set the require Encryption, KEK and key resolver on the service object.
+                tableservice.key_encryption_key = self._kek
+                tableservice.key_resolver_function = self._key_resolver.resolve_key
+                tableservice.encryption_resolver_function = encryptionresolver
+
+            self._tableservices[key] = tableservice
+
+        return tableservice
 
     def __createtable__(self, modeldefinition:dict) -> bool:
 
@@ -324,7 +982,7 @@ class StorageTableContext():
         if modeldefinition is None:
 
             """ test if queuename already exists """
-            if [model for model in self._modeldefinitions if model['tablename'] == storagemodel._tablename]:
+            if storagemodel._tablename in self._tableindex:
                 raise NameConventionError(storagemodel._tablename)
 
             """ test if queuename fits to azure naming rules """
@@ -334,35 +992,17 @@ class StorageTableContext():
             """ now register model """
             modeldefinition = {
                 'modelname': storagemodel.__class__.__name__,
+                'modelclass': storagemodel.__class__,
                 'tablename': storagemodel._tablename,
                 'encrypt': storagemodel._encrypt,
-                'tableservice': self._account.create_table_service()
+                'tableservice': self.__tableservice__(storagemodel._encrypt)
                 }
 
-            if modeldefinition['encrypt']:
-                """ encrypt init """
-                # Create the KEK used for encryption.
-                # KeyWrapper is the provided sample implementation, but the user may use their own object as long as it implements the interface above.
-                kek = KeyWrapper(self._key_identifier, self._secret_key) #  Key identifier
-
-                # Create the key resolver used for decryption.
-                # KeyResolver is the provided sample implementation, but the user may use whatever implementation they choose so long as the function set on the service object behaves appropriately.
-                key_resolver = KeyResolver()
-                key_resolver.put_key(kek)
-
-                # Create the EncryptionResolver Function to determine Properties to en/decrypt
-                encryptionresolver = self.__encryptionresolver__(modeldefinition['encrypt'])
-
-
-                # Set the require Encryption, KEK and key resolver on the service object.
-                modeldefinition['tableservice'].key_encryption_key = kek
-                modeldefinition['tableservice'].key_resolver_funcion = key_resolver.resolve_key
-                modeldefinition['tableservice'].encryption_resolver_function = encryptionresolver
-                pass
-
             self.__createtable__(modeldefinition)
                 
             self._modeldefinitions.append(modeldefinition)
+            self._modelindex[modeldefinition['modelclass']] = modeldefinition
+            self._tableindex[modeldefinition['tablename']] = modeldefinition
 
             log.info('model {} registered successfully. Models are {!s}.'.format(modeldefinition['modelname'], [model['modelname'] for model in self._modeldefinitions]))
         else:
@@ -384,16 +1024,80 @@ class StorageTableContext():
         modeldefinition = self.getmodeldefinition(storagemodel, True)
 
         # remove from modeldefinitions
-        for i in range(len(self._modeldefinitions)):
-            if self._modeldefinitions[i]['modelname'] == modeldefinition['modelname']:
-                del self._modeldefinitions[i]
-                break
+        self._modeldefinitions.remove(modeldefinition)
+        del self._modelindex[modeldefinition['modelclass']]
+        del self._tableindex[modeldefinition['tablename']]
         
         # delete table from storage if delete_table == True        
         if delete_table:
             self.__deletetable__(modeldefinition)
         pass
 
+    def __getentity__(self, modeldefinition, pk, rk):
+        """ read entity through the cache if configured, raises AzureMissingResourceHttpError if it does not exist """
+        if self._cache is None:
+            return modeldefinition['tableservice'].get_entity(modeldefinition['tablename'], pk, rk)
+
+        key = (modeldefinition['tablename'], pk, rk)
+        entity = self._cache.get(key)
+
+        if entity is None:
+            try:
+                entity = modeldefinition['tableservice'].get_entity(modeldefinition['tablename'], pk, rk)
+                self._cache.put(key, entity)
+
+            except AzureMissingResourceHttpError:
+                self._cache.put(key, StorageTableCache.MISSING)
+                raise
+
+        elif entity is StorageTableCache.MISSING:
+            raise AzureMissingResourceHttpError('cached: entity does not exist', 404)
+
+        return entity
+
+    def __hydrate__(self, storagemodel, entity):
+        """ sync model with the values of a loaded entity, cast through the schema like fromentity """
+        storagemodel._exists = True
+        storagemodel._etag = entity.get('etag', None)
+
+        schema = storagemodel._schema
+        for key, to_type, default, dformat in schema.fields:
+            if not key in schema.properties:
+                continue
+            value = entityvalue(entity.get(key, None))
+            if not value is None:
+                if type(value) is not to_type:
+                    value = safe_cast(value, to_type, default, dformat)
+                setattr(storagemodel, key, value)
+        storagemodel.cleardelta()
+
+    def __invalidate__(self, modeldefinition, storagemodel):
+        """ drop a written entity from the cache """
+        if not self._cache is None:
+            self._cache.invalidate((modeldefinition['tablename'], storagemodel.getPartitionKey(), storagemodel.getRowKey()))
+
+    def cache_info(self) -> dict:
+        """ hit/ miss counters and size of the entity cache """
+        if self._cache is None:
+            return {}
+        return self._cache.info()
+
+    def buffer_info(self) -> dict:
+        """ size and committed/ failed counters of the write behind buffer """
+        if self._buffer is None:
+            return {}
+        return self._buffer.info()
+
+    def flush(self):
+        """ write all models buffered by insert (see AZURE_TABLE_BUFFER_SIZE) """
+        if not self._buffer is None:
+            self._buffer.flush()
+
+    def close(self):
+        """ flush and stop the write behind buffer """
+        if not self._buffer is None:
+            self._buffer.close()
+
     # methods
     def exists(self, storagemodel) -> bool:
         
@@ -404,7 +1108,7 @@ class StorageTableContext():
                 pk = storagemodel.getPartitionKey()
                 rk = storagemodel.getRowKey()
 
-                entity = modeldefinition['tableservice'].get_entity(modeldefinition['tablename'], pk, rk)
+                entity = self.__getentity__(modeldefinition, pk, rk)
                 storagemodel._exists = True
                 exists = True
             
@@ -429,15 +1133,8 @@ class StorageTableContext():
             pk = storagemodel.getPartitionKey()
             rk = storagemodel.getRowKey()
 
-            entity = modeldefinition['tableservice'].get_entity(modeldefinition['tablename'], pk, rk)
-            storagemodel._exists = True
-        
-            """ sync with entity values """
-            for key, default in vars(storagemodel).items():
-                if not key.startswith('_') and key not in ['','PartitionKey','RowKey']:
-                    value = getattr(entity, key, None)
-                    if not value is None:
-                        setattr(storagemodel, key, value)
+            entity = self.__getentity__(modeldefinition, pk, rk)
+            self.__hydrate__(storagemodel, entity)
              
         except AzureMissingResourceHttpError as e:
             log.debug('can not get table entity:  Table {}, PartitionKey {}, RowKey {} because {!s}'.format(modeldefinition['tablename'], pk, rk, e))
@@ -450,92 +1147,497 @@ class StorageTableContext():
         finally:
             return storagemodel
 
-    def insert(self, storagemodel) -> StorageTableModel:
-        """ insert model into storage """
+    def insert(self, storagemodel, overwrite=True) -> StorageTableModel:
+        """ insert model into storage, an existing entity is replaced 
+            unless overwrite is False, then EntityConflictError is raised if the entity already exists
+
+            with a write behind buffer (AZURE_TABLE_BUFFER_SIZE) an overwriting insert only buffers the model and
+            returns immediately, _exists is set when the batch is written. do not change the model until then
+        """
+        if overwrite and (not self._buffer is None):
+            self._buffer.put(storagemodel)
+            return storagemodel
 
         modeldefinition = self.getmodeldefinition(storagemodel, True)
+        conflict = False
 
         try:
-            modeldefinition['tableservice'].insert_or_replace_entity(modeldefinition['tablename'], storagemodel.entity())
+            if overwrite:
+                storagemodel._etag = modeldefinition['tableservice'].insert_or_replace_entity(modeldefinition['tablename'], storagemodel.entity())
+            else:
+                storagemodel._etag = modeldefinition['tableservice'].insert_entity(modeldefinition['tablename'], storagemodel.entity())
             storagemodel._exists = True
+            storagemodel.cleardelta()
 
         except AzureMissingResourceHttpError as e:
             storagemodel._exists = False
             log.debug('can not insert or replace table entity:  Table {}, PartitionKey {}, RowKey {} because {!s}'.format(modeldefinition['tablename'], storagemodel.getPartitionKey(), storagemodel.getRowKey(), e))
 
+        except AzureConflictHttpError as e:
+            conflict = True
+            log.debug('can not insert table entity:  Table {}, PartitionKey {}, RowKey {} because {!s}'.format(modeldefinition['tablename'], storagemodel.getPartitionKey(), storagemodel.getRowKey(), e))
+
         except Exception as e:
             storagemodel._exists = False
-            msg = 'can not insert or replace table entity:  Table {}, PartitionKey {}, RowKey {} because {!s}'.format(modeldefinition['tablename'], storagemodel.PartitionKey, storagemodel.RowKey, e)
+            msg = 'can not insert or replace table entity:  Table {}, PartitionKey {}, RowKey {} because {!s}'.format(modeldefinition['tablename'], storagemodel.getPartitionKey(), storagemodel.getRowKey(), e)
             raise AzureStorageWrapException(msg=msg)
 
         finally:
-            return storagemodel
+            self.__invalidate__(modeldefinition, storagemodel)
+
+        if conflict:
+            raise EntityConflictError(storagemodel)
+        return storagemodel
 
-    def merge(self, storagemodel) -> StorageTableModel:
-        """ try to merge entry """
+    def replace(self, storagemodel, if_match='*') -> StorageTableModel:
+        """ replace an existing entity with all properties of the model
+            pass the etag of the loaded model (storagemodel._etag) as if_match to replace only if nobody 
+            changed the entity in between, otherwise EntityConflictError is raised
+        """
         modeldefinition = self.getmodeldefinition(storagemodel, True)
+        pk = storagemodel.getPartitionKey()
+        rk = storagemodel.getRowKey()
+        conflict = False
+
+        try:
+            storagemodel._etag = modeldefinition['tableservice'].update_entity(modeldefinition['tablename'], storagemodel.entity(), if_match=if_match)
+            storagemodel._exists = True
+            storagemodel.cleardelta()
+
+        except AzureMissingResourceHttpError as e:
+            storagemodel._exists = False
+            log.debug('can not replace table entity:  Table {}, PartitionKey {}, RowKey {} because {!s}'.format(modeldefinition['tablename'], pk, rk, e))
+
+        except AzureHttpError as e:
+            if e.status_code != 412:
+                msg = 'can not replace table entity:  Table {}, PartitionKey {}, RowKey {} because {!s}'.format(modeldefinition['tablename'], pk, rk, e)
+                raise AzureStorageWrapException(msg=msg)
+            conflict = True
+            log.debug('can not replace table entity:  Table {}, PartitionKey {}, RowKey {} because {!s}'.format(modeldefinition['tablename'], pk, rk, e))
+
+        finally:
+            self.__invalidate__(modeldefinition, storagemodel)
+
+        if conflict:
+            raise EntityConflictError(storagemodel)
+        return storagemodel
+
+    def merge(self, storagemodel, if_match=None) -> StorageTableModel:
+        """ merge properties changed since construction or last load/ save (see StorageTableModel.delta) into the stored entity
+            Skips the request if there are no changed properties.
+
+            Only existing entities are merged, a missing entity is not created and storagemodel._exists is False
+            (use insert for upserts). Models without encrypted properties are merged server side in one request.
+            Client side encryption does not support merge, so encrypted models are read, merged and conditionally replaced.
+            If the entity does not match if_match (e.g. storagemodel._etag of the loaded model) EntityConflictError is raised.
+        """
+        modeldefinition = self.getmodeldefinition(storagemodel, True)
+        pk = storagemodel.getPartitionKey()
+        rk = storagemodel.getRowKey()
+        conflict = False
        
         try:
-            pk = storagemodel.getPartitionKey()
-            rk = storagemodel.getRowKey()
-            entity = modeldefinition['tableservice'].get_entity(modeldefinition['tablename'], pk, rk)
-        
-            """ merge with entity values """
-            for key, default in vars(storagemodel.__class__).items():
-                if not key.startswith('_') and key not in ['']:
+            delta = storagemodel.delta()
+            if len(delta) <= 2:
+                log.debug('nothing to merge:  Table {}, PartitionKey {}, RowKey {}'.format(modeldefinition['tablename'], pk, rk))
 
-                    if isinstance(default, PartitionKey) or isinstance(default, RowKey) or  isinstance(default, EncryptKey):
-                        default = default._default
+            elif not modeldefinition['encrypt']:
+                storagemodel._etag = modeldefinition['tableservice'].merge_entity(modeldefinition['tablename'], delta, if_match='*' if if_match is None else if_match)
+                storagemodel._exists = True
+                storagemodel.cleardelta()
 
-                    newvalue = getattr(storagemodel, key, None)
-                    if (newvalue is None) or (newvalue == default):
-                        oldvalue = getattr(entity, key, default)
-                        setattr(storagemodel, key, oldvalue)
+            else:
+                entity = modeldefinition['tableservice'].get_entity(modeldefinition['tablename'], pk, rk)
             
-            modeldefinition['tableservice'].insert_or_replace_entity(modeldefinition['tablename'], storagemodel.entity())
-            storagemodel._exists = True
+                """ merge unchanged properties with entity values """
+                for key in storagemodel._schema.properties:
+                    if not key in delta:
+                        oldvalue = entityvalue(entity.get(key, storagemodel._schema.defaults[key]))
+                        setattr(storagemodel, key, oldvalue)
+                
+                """ replace only if nobody changed the entity in between """
+                storagemodel._etag = modeldefinition['tableservice'].update_entity(modeldefinition['tablename'], storagemodel.entity(), if_match=entity['etag'] if if_match is None else if_match)
+                storagemodel._exists = True
+                storagemodel.cleardelta()
 
         except AzureMissingResourceHttpError as e:
+            """ a conditional merge of an entity deleted in between is a conflict too """
+            conflict = not if_match is None
+            storagemodel._exists = False
+            log.debug('can not merge table entity:  Table {}, PartitionKey {}, RowKey {} because {!s}'.format(modeldefinition['tablename'], pk, rk, e))
+
+        except AzureHttpError as e:
+            if e.status_code != 412:
+                msg = 'can not merge table entity:  Table {}, PartitionKey {}, RowKey {} because {!s}'.format(modeldefinition['tablename'], pk, rk, e)
+                raise AzureStorageWrapException(msg=msg)
+            conflict = True
             log.debug('can not merge table entity:  Table {}, PartitionKey {}, RowKey {} because {!s}'.format(modeldefinition['tablename'], pk, rk, e))
 
         except Exception as e:
             log.debug('can not merge table entity:  Table {}, PartitionKey {}, RowKey {} because {!s}'.format(modeldefinition['tablename'], pk, rk, e))
 
         finally:
-            return storagemodel
+            self.__invalidate__(modeldefinition, storagemodel)
 
-    def delete(self,storagemodel):
-        """ delete existing Entity """
+        if conflict:
+            raise EntityConflictError(storagemodel)
+        return storagemodel
+
+    def delete(self,storagemodel, if_match='*'):
+        """ delete existing Entity 
+            pass storagemodel._etag as if_match to delete only if nobody changed the entity since it was loaded,
+            otherwise EntityConflictError is raised
+        """
             
         modeldefinition = self.getmodeldefinition(storagemodel, True)
 
         pk = storagemodel.getPartitionKey()
         rk = storagemodel.getRowKey()
+        conflict = False
 
         try:
-            modeldefinition['tableservice'].delete_entity(modeldefinition['tablename'], pk, rk)
+            modeldefinition['tableservice'].delete_entity(modeldefinition['tablename'], pk, rk, if_match=if_match)
             storagemodel._exists = False
+            storagemodel._etag = None
 
         except AzureMissingResourceHttpError as e:
             log.debug('can not delete table entity:  Table {}, PartitionKey {}, RowKey {} because {!s}'.format(modeldefinition['tablename'], pk, rk, e))
 
+        except AzureHttpError as e:
+            if e.status_code != 412:
+                msg = 'can not delete table entity:  Table {}, PartitionKey {}, RowKey {} because {!s}'.format(modeldefinition['tablename'], pk, rk, e)
+                raise AzureStorageWrapException(msg=msg)
+            conflict = True
+            log.debug('can not delete table entity:  Table {}, PartitionKey {}, RowKey {} because {!s}'.format(modeldefinition['tablename'], pk, rk, e))
+
         finally:
-            return storagemodel
+            self.__invalidate__(modeldefinition, storagemodel)
+
+        if conflict:
+            raise EntityConflictError(storagemodel)
+        return storagemodel
+
+    def update_with_retry(self, storagemodel, modify, retries=3) -> StorageTableModel:
+        """ optimistic read-modify-write without locks: load the entity, call modify(storagemodel) and merge the 
+            changed properties only if nobody changed the entity in between (an entity that does not exist yet is inserted 
+            only if nobody created it in between). On a conflict the entity is reloaded into a new model and modify is called again, 
+            EntityConflictError is raised if the last of 1 + retries attempts failed as well. Returns the updated model.
+        """
+        for storagemodel in self.__attempts__(storagemodel, retries):
+            storagemodel = self.get(storagemodel)
+            modify(storagemodel)
+            try:
+                return self.__conditionalwrite__(storagemodel)
+            except EntityConflictError:
+                pass
 
-    def query(self, storagequery) -> StorageTableQuery:
+    def __attempts__(self, storagemodel, retries):
+        """ key only models of the entity, one per attempt of update_with_retry, raises EntityConflictError when all attempts are used up """
+        modelclass = storagemodel.__class__
+        keys = {storagemodel._PartitionKey: getattr(storagemodel, storagemodel._PartitionKey), storagemodel._RowKey: getattr(storagemodel, storagemodel._RowKey)}
+
+        for attempt in range(retries + 1):
+            storagemodel = modelclass(**keys)
+            yield storagemodel
+            log.debug('conflict on attempt {!s} to update table entity:  PartitionKey {}, RowKey {}'.format(attempt + 1, storagemodel.getPartitionKey(), storagemodel.getRowKey()))
+
+        raise EntityConflictError(storagemodel)
+
+    def __conditionalwrite__(self, storagemodel):
+        """ write of update_with_retry: merge if nobody changed the loaded entity, insert if nobody created it in between
+            returns the coroutine of merge/ insert for AsyncStorageTableContext
+        """
+        if storagemodel._exists:
+            return self.merge(storagemodel, if_match=storagemodel._etag)
+        else:
+            return self.insert(storagemodel, overwrite=False)
+
+    def map(self, operation, storageobjects, max_workers=DEFAULT_POOL_SIZE) -> list:
+        """ run an operation (e.g. 'get', 'insert', 'merge', 'delete', 'exists' or any callable) 
+            concurrently for a list of models on a bounded thread pool
+
+            returns the results in the order of storageobjects. If any operation fails
+            BulkOperationError is raised after all operations finished with .results and .errors [(index, exception)]
+        """
+        if isinstance(operation, str):
+            operation = getattr(self, operation)
+
+        storageobjects = list(storageobjects)
+        results = [None] * len(storageobjects)
+        errors = []
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(storageobjects)))) as executor:
+            futures = [executor.submit(operation, storageobject) for storageobject in storageobjects]
+            for index, future in enumerate(futures):
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    errors.append((index, e))
+
+        if errors:
+            raise BulkOperationError(results, errors)
+
+        return results
+
+    def __batches__(self, storagemodels) -> list:
+        """ group storagemodels by table and PartitionKey into entity group transactions
+            of at most MAX_BATCH_SIZE entities and unique RowKeys
+        """
+        batches = []
+        openbatches = {}
+
+        for storagemodel in storagemodels:
+            modeldefinition = self.getmodeldefinition(storagemodel, True)
+            group = (modeldefinition['tablename'], storagemodel.getPartitionKey())
+            rk = storagemodel.getRowKey()
+
+            batch = openbatches.get(group, None)
+            if (batch is None) or (len(batch['storagemodels']) >= self.MAX_BATCH_SIZE) or (rk in batch['rowkeys']):
+                batch = {'modeldefinition': modeldefinition,
+                         'storagemodels': [],
+                         'rowkeys': set()}
+                openbatches[group] = batch
+                batches.append(batch)
+
+            batch['storagemodels'].append(storagemodel)
+            batch['rowkeys'].add(rk)
+
+        return batches
+
+    def __commitbatch__(self, batch, operation) -> bool:
+        """ commit one entity group transaction, True if the service accepted it """
+        modeldefinition = batch['modeldefinition']
+        tableservice = modeldefinition['tableservice']
+
+        tablebatch = TableBatch(tableservice.require_encryption, tableservice.key_encryption_key, tableservice.encryption_resolver_function)
+        for storagemodel in batch['storagemodels']:
+            if operation == 'insert':
+                tablebatch.insert_or_replace_entity(storagemodel.entity())
+            elif operation == 'merge':
+                tablebatch.merge_entity(storagemodel.delta(), if_match='*')
+            elif operation == 'delete':
+                tablebatch.delete_entity(storagemodel.getPartitionKey(), storagemodel.getRowKey())
+
+        try:
+            etags = tableservice.commit_batch(modeldefinition['tablename'], tablebatch)
+            for index, storagemodel in enumerate(batch['storagemodels']):
+                storagemodel._etag = etags[index] if etags else None
+                self.__invalidate__(modeldefinition, storagemodel)
+            return True
+
+        except AzureException as e:
+            log.error('can not {} table entities in batch:  Table {}, PartitionKey {}, count {!s} because {!s}'.format(operation, modeldefinition['tablename'], batch['storagemodels'][0].getPartitionKey(), len(batch['storagemodels']), e))
+            return False
+
+    def __pointqueries__(self, storagemodels) -> tuple:
+        """ group storagemodels by table and PartitionKey into point queries (see __rowkeyfilters__) """
+        partitions = OrderedDict()
+        for storagemodel in storagemodels:
+            modeldefinition = self.getmodeldefinition(storagemodel, True)
+            group = (modeldefinition['tablename'], storagemodel.getPartitionKey())
+            if not group in partitions:
+                partitions[group] = {'modeldefinition': modeldefinition, 'rowkeys': OrderedDict()}
+            partitions[group]['rowkeys'].setdefault(storagemodel.getRowKey(), []).append(storagemodel)
+
+        queries = []
+        for (tablename, pk), partition in partitions.items():
+            for filter in self.__rowkeyfilters__(pk, partition['rowkeys']):
+                queries.append((partition['modeldefinition'], filter))
+
+        return partitions, queries
+
+    def __rowkeyfilters__(self, pk, rowkeys) -> list:
+        """ split the RowKeys of one partition into filters PartitionKey eq 'pk' and (RowKey eq 'rk1' or ...) 
+            within the service limits of MAX_FILTER_COMPARISONS comparisons and MAX_FILTER_LENGTH characters
+        """
+        filters = []
+        pkfilter = "PartitionKey eq '{!s}'".format(str(pk).replace("'", "''"))
+        rkfilters = []
+        for rk in rowkeys:
+            rkfilter = "RowKey eq '{!s}'".format(str(rk).replace("'", "''"))
+            length = len(pkfilter + ' and (' + ' or '.join(rkfilters + [rkfilter]) + ')')
+            if rkfilters and ((len(rkfilters) + 2 > self.MAX_FILTER_COMPARISONS) or (length > self.MAX_FILTER_LENGTH)):
+                filters.append(pkfilter + ' and (' + ' or '.join(rkfilters) + ')')
+                rkfilters = []
+            rkfilters.append(rkfilter)
+
+        if rkfilters:
+            filters.append(pkfilter + ' and (' + ' or '.join(rkfilters) + ')')
+        return filters
+
+    def __queryentities__(self, modeldefinition, filter, select=None) -> list:
+        """ query all entities (following continuation markers) of a filter """
+        try:
+            return list(modeldefinition['tableservice'].query_entities(modeldefinition['tablename'], filter=filter, select=select))
+
+        except AzureMissingResourceHttpError as e:
+            log.debug('can not query table {} with filters {} because {!s}'.format(modeldefinition['tablename'], filter, e))
+            return []
+
+        except Exception as e:
+            msg = 'can not query table {} with filters {} because {!s}'.format(modeldefinition['tablename'], filter, e)
+            raise AzureStorageWrapException(msg=msg)
+
+    def get_many(self, storagemodels, max_workers=DEFAULT_POOL_SIZE) -> list:
+        """ load a list of models by PartitionKey and RowKey with few combined queries instead of one request per model
+            the queries per partition run concurrently on a bounded thread pool. Models are loaded in place 
+            and returned in given order, _exists is False for every entity that does not exist
+        """
+        storagemodels = list(storagemodels)
+        partitions, queries = self.__pointqueries__(storagemodels)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(queries)))) as executor:
+            results = list(executor.map(lambda query: self.__queryentities__(*query), queries))
+
+        for storagemodel in storagemodels:
+            storagemodel._exists = False
+
+        for (modeldefinition, filter), entities in zip(queries, results):
+            for entity in entities:
+                group = (modeldefinition['tablename'], str(entity['PartitionKey']))
+                for storagemodel in partitions[group]['rowkeys'].get(str(entity['RowKey']), []):
+                    self.__hydrate__(storagemodel, entity)
+
+        return storagemodels
+
+    def load_relationship(self, storagemodels, relationship, max_workers=DEFAULT_POOL_SIZE, raw=False) -> list:
+        """ eager load a relationship (StorageTableQuery property like TableThree.OneToN) of a list of models
+            instead of one query per model: models with the same foreign keys share one query, 
+            equal foreign keys on PartitionKey and RowKey are combined into point queries per partition.
+            The queries run concurrently on a bounded thread pool, the resulting entities are filled 
+            into the relationship query of each model like query does (as models or raw). Returns the models in given order.
+
+            required Parameters are:
+            - storagemodels: list of StorageTableModel (Objects) of the same model
+            - relationship: str (name of the StorageTableQuery property)
+        """
+        storagemodels = list(storagemodels)
+        if storagemodels == []:
+            return storagemodels
+
+        schema = storagemodels[0].__class__._schema
+        if not relationship in schema.relationships:
+            raise AzureStorageWrapException(storagemodels[0], '{!s} is not a relationship of model {!s}'.format(relationship, storagemodels[0].__class__.__name__))
+
+        """ the class attribute of compact models is a slot, the relationship query is kept in the schema """
+        relationquery = schema.defaults[relationship]
+        modeldefinition = self.getmodeldefinition(relationquery, True)
+        pointquery = (relationquery._pkcondition == 'eq') and (relationquery._rkcondition == 'eq') and (relationquery._where is None)
+
+        """ coalesce the foreign keys of all models into as few queries as possible """
+        queries = []
+        targets = []
+        queryindex = {}
+        pointkeys = OrderedDict()
+        for storagemodel in storagemodels:
+            storagequery = getattr(storagemodel, relationship)
+            if pointquery:
+                pointkeys.setdefault(str(storagequery._pkforeignkey), OrderedDict())[str(storagequery._rkforeignkey)] = True
+                targets.append((storagequery, (str(storagequery._pkforeignkey), str(storagequery._rkforeignkey))))
+            else:
+                if not storagequery._queryfilter in queryindex:
+                    queryindex[storagequery._queryfilter] = len(queries)
+                    queries.append(storagequery._queryfilter)
+                targets.append((storagequery, queryindex[storagequery._queryfilter]))
+
+        for pk, rowkeys in pointkeys.items():
+            queries += self.__rowkeyfilters__(pk, rowkeys)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(queries)))) as executor:
+            results = list(executor.map(lambda filter: self.__queryentities__(modeldefinition, filter, relationquery._select), queries))
+
+        """ distribute the entities back onto the models """
+        hydrate = (lambda entity: entity) if raw else relationquery._storagemodel.__class__.fromentity
+        if pointquery:
+            entities = {}
+            for result in results:
+                for entity in result:
+                    entities[(str(entity['PartitionKey']), str(entity['RowKey']))] = entity
+
+        for storagequery, target in targets:
+            storagequery.clear()
+            if pointquery:
+                if target in entities:
+                    storagequery.append(hydrate(entities[target]))
+            else:
+                storagequery.extend([hydrate(entity) for entity in results[target]])
+
+        return storagemodels
+
+    def insert_many(self, storagemodels) -> list:
+        """ insert or replace a list of models grouped by PartitionKey in entity group transactions
+            returns the models in given order, _exists indicates the outcome per entity
+        """
+        storagemodels = list(storagemodels)
+        for batch in self.__batches__(storagemodels):
+            committed = self.__commitbatch__(batch, 'insert')
+            for storagemodel in batch['storagemodels']:
+                storagemodel._exists = committed
+                if committed:
+                    storagemodel.cleardelta()
+
+        return storagemodels
+
+    def merge_many(self, storagemodels) -> list:
+        """ merge the changed properties of a list of models into existing entities grouped by PartitionKey in entity group transactions
+            models without changes are skipped, a missing entity fails the transaction of its batch (see merge).
+            returns the models in given order, _exists indicates the outcome per entity
+        """
+        storagemodels = list(storagemodels)
+
+        """ client side encryption does not support merge, merge encrypted models one by one """
+        unencrypted = []
+        for storagemodel in storagemodels:
+            if self.getmodeldefinition(storagemodel, True)['encrypt']:
+                StorageTableContext.merge(self, storagemodel)
+            elif len(storagemodel.delta()) > 2:
+                unencrypted.append(storagemodel)
+
+        for batch in self.__batches__(unencrypted):
+            committed = self.__commitbatch__(batch, 'merge')
+            for storagemodel in batch['storagemodels']:
+                storagemodel._exists = committed
+                if committed:
+                    storagemodel.cleardelta()
+
+        return storagemodels
+
+    def delete_many(self, storagemodels) -> list:
+        """ delete a list of models grouped by PartitionKey in entity group transactions
+            returns the models in given order, _exists is False for every deleted entity
+        """
+        storagemodels = list(storagemodels)
+        for batch in self.__batches__(storagemodels):
+            if self.__commitbatch__(batch, 'delete'):
+                for storagemodel in batch['storagemodels']:
+                    storagemodel._exists = False
+
+        return storagemodels
+
+    def query(self, storagequery, raw=False) -> StorageTableQuery:
+        """ query storage into the result set of storagequery
+            entities are hydrated into instances of the queried StorageTableModel (see StorageTableModel.fromentity),
+            pass raw=True to keep the queried entities (dict) if you do not need models
+        """
 
         modeldefinition = self.getmodeldefinition(storagequery, True)
+        modelclass = storagequery._storagemodel.__class__
         
         try:
             
             if (not storagequery._select is None) and (storagequery._select != ''):
-                storagequery.extend(modeldefinition['tableservice'].query_entities(modeldefinition['tablename'],filter=storagequery._queryfilter, select=storagequery._select))
+                entities = modeldefinition['tableservice'].query_entities(modeldefinition['tablename'],filter=storagequery._queryfilter, select=storagequery._select)
+            else:
+                entities = modeldefinition['tableservice'].query_entities(modeldefinition['tablename'],filter=storagequery._queryfilter)
+
+            if raw:
+                storagequery.extend(entities)
             else:
-                storagequery.extend(modeldefinition['tableservice'].query_entities(modeldefinition['tablename'],filter=storagequery._queryfilter))
+                storagequery.extend([modelclass.fromentity(entity) for entity in entities])
 
         except AzureMissingResourceHttpError as e:
-            storagequery = []
             log.debug('can not query table {} with filters {} because {!s}'.format(modeldefinition['tablename'], storagequery._queryfilter, e))
+            storagequery = []
 
         except Exception as e:
             msg = 'can not query table {} with filters {} because {!s}'.format(modeldefinition['tablename'], storagequery._queryfilter, e)
@@ -543,31 +1645,209 @@ class StorageTableContext():
 
         return storagequery
 
-    def table_isempty(self, tablename, PartitionKey='', RowKey = '') -> bool:
-        if  (not self._tableservice is None):
+    def __querypage__(self, modeldefinition, storagequery, num_results, marker=None):
+        """ request one page of entities, returns the entities and the continuation marker for the next page """
+        select = None
+        if (not storagequery._select is None) and (storagequery._select != ''):
+            select = storagequery._select
+
+        try:
+            entities = modeldefinition['tableservice'].query_entities(modeldefinition['tablename'], filter=storagequery._queryfilter, select=select, num_results=num_results, marker=marker)
+            return list(entities), entities.next_marker
+
+        except AzureMissingResourceHttpError as e:
+            log.debug('can not query table {} with filters {} because {!s}'.format(modeldefinition['tablename'], storagequery._queryfilter, e))
+            return [], None
+
+        except Exception as e:
+            msg = 'can not query table {} with filters {} because {!s}'.format(modeldefinition['tablename'], storagequery._queryfilter, e)
+            raise AzureStorageWrapException(msg=msg)
+
+    def iter_query(self, storagequery, page_size=1000, limit=None, raw=False):
+        """ lazily query storage page by page following the continuation marker
+            yields StorageTableModel instances instead of collecting all entities in storagequery
 
-            filter = "PartitionKey eq '{}'".format(PartitionKey) if PartitionKey != '' else ''
-            if filter == '':
-                filter = "RowKey eq '{}'".format(RowKey) if RowKey != '' else ''
+            required Parameter is:
+            - storagequery: StorageTableQuery(Object)
+
+            Optional Parameters are:
+            - page_size: int (entities requested per round trip)
+            - limit: int (stop after limit entities)
+            - raw: bool (yield the queried entities (dict) instead of models)
+        """
+        modelclass = storagequery._storagemodel.__class__
+
+        for page in self.__querypages__(storagequery, page_size, limit):
+            if raw:
+                yield from page
             else:
-                filter = filter + ("and RowKey eq '{}'".format(RowKey) if RowKey != '' else '')
+                for entity in page:
+                    yield modelclass.fromentity(entity)
+
+    def __querypages__(self, storagequery, page_size=1000, limit=None):
+        """ yield the pages of a query following the continuation marker """
+        modeldefinition = self.getmodeldefinition(storagequery, True)
+
+        marker = None
+        count = 0
+        while (limit is None) or (count < limit):
+
+            num_results = page_size if limit is None else min(page_size, limit - count)
+            page, marker = self.__querypage__(modeldefinition, storagequery, num_results, marker)
+            yield page
+
+            count += len(page)
+            if not marker:
+                break
+
+    def __scanpages__(self, storagequery, ranges=None, max_workers=DEFAULT_POOL_SIZE, page_size=1000):
+        """ yield the pages of concurrent queries per PartitionKey range in order of arrival """
+        self.getmodeldefinition(storagequery, True)
+        if ranges is None:
+            ranges = keyspace_ranges()
+
+        rangequeries = []
+        for low, high in ranges:
+            rangefilter = StorageTableFilter()
+            if not low is None:
+                rangefilter = rangefilter & (StorageTableProperty('PartitionKey') >= low)
+            if not high is None:
+                rangefilter = rangefilter & (StorageTableProperty('PartitionKey') < high)
+
+            rangequeries.append(StorageTableQuery(storagequery._storagemodel, 
+                                                  storagequery._pkcondition, storagequery._pkforeignkey, 
+                                                  storagequery._rkcondition, storagequery._rkforeignkey, 
+                                                  storagequery._select, storagequery._where).where(rangefilter))
+
+        """ bounded queue between the range workers and the consumer """
+        pages = queue.Queue(maxsize=2 * max_workers)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def scanrange(rangequery):
             try:
-                entities = list(modeldefinition['tableservice'].query_entities(tablename, filter = filter, select='PartitionKey', num_results=1))
-                if len(entities) == 1: 
-                    return False
+                for page in self.__querypages__(rangequery, page_size):
+                    if not put(page):
+                        return
+                put(None)
+            except Exception as e:
+                put(e)
+
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(rangequeries))))
+        try:
+            for rangequery in rangequeries:
+                executor.submit(scanrange, rangequery)
+
+            finished = 0
+            while finished < len(rangequeries):
+                page = pages.get()
+                if page is None:
+                    finished += 1
+                elif isinstance(page, Exception):
+                    raise page
                 else:
-                    return True
+                    yield page
 
-            except AzureMissingResourceHttpError as e:
-                log.debug('failed to query {} with error {}'.format(tablename, e))
-                return True
+        finally:
+            stop.set()
+            executor.shutdown(wait=True)
 
-            except Exception as e:
-                msg = '{!s}'.format(e)
-                raise AzureStorageWrapException(msg=msg)
-        else:
-            return True
-        pass
+    def scan(self, storagequery, ranges=None, max_workers=DEFAULT_POOL_SIZE, page_size=1000, raw=False):
+        """ full or filtered table scan split into PartitionKey ranges that are queried concurrently, 
+            yields StorageTableModel instances as the pages of all ranges arrive (not ordered by key)
+
+            required Parameter is:
+            - storagequery: StorageTableQuery(Object)
+
+            Optional Parameters are:
+            - ranges: list of (low, high) PartitionKey ranges, low inclusive, high exclusive, None for open ends
+                      default splits hex keys like uuids into 16 ranges (see snippets.keyspace_ranges)
+            - max_workers: int (ranges scanned at the same time)
+            - page_size: int (entities requested per round trip)
+            - raw: bool (yield the queried entities (dict) instead of models)
+        """
+        modelclass = storagequery._storagemodel.__class__
+
+        for page in self.__scanpages__(storagequery, ranges, max_workers, page_size):
+            if raw:
+                yield from page
+            else:
+                for entity in page:
+                    yield modelclass.fromentity(entity)
+
+    def query_columns(self, storagequery, page_size=1000, limit=None, tonumpy=False) -> OrderedDict:
+        """ query storage page by page into columns {property: [values]} without keeping entities or models in memory
+            returns typed numpy arrays instead of lists if tonumpy is True (see StorageTableQuery.to_numpy)
+        """
+        columns = OrderedDict([(key, []) for key in storagequery.__columntypes__()])
+        for page in self.__querypages__(storagequery, page_size, limit):
+            storagequery.__appendcolumns__(columns, page)
+
+        if tonumpy:
+            return storagequery.to_numpy(columns)
+        return columns
+
+    def __probe__(self, modeldefinition, filter, num_results=None):
+        """ key only query, yields PartitionKeys page by page """
+        try:
+            for entity in modeldefinition['tableservice'].query_entities(modeldefinition['tablename'], filter=filter if filter != '' else None, select='PartitionKey', num_results=num_results):
+                yield entity
+
+        except AzureMissingResourceHttpError as e:
+            log.debug('can not query table {} with filters {} because {!s}'.format(modeldefinition['tablename'], filter, e))
+
+        except Exception as e:
+            msg = 'can not query table {} with filters {} because {!s}'.format(modeldefinition['tablename'], filter, e)
+            raise AzureStorageWrapException(msg=msg)
+
+    def isempty(self, storageobject) -> bool:
+        """ True if the table of a StorageTableModel or the result set of a StorageTableQuery has no entity
+            probes a single key only entity ($top=1, $select=PartitionKey) instead of querying the entities
+        """
+        modeldefinition = self.getmodeldefinition(storageobject, True)
+        filter = storageobject._queryfilter if isinstance(storageobject, StorageTableQuery) else ''
+
+        for entity in self.__probe__(modeldefinition, filter, num_results=1):
+            return False
+        return True
+
+    def count(self, storageobject) -> int:
+        """ number of entities in the table of a StorageTableModel or the result set of a StorageTableQuery
+            streams key only pages ($select=PartitionKey), so only one page is kept in memory at a time
+        """
+        modeldefinition = self.getmodeldefinition(storageobject, True)
+        filter = storageobject._queryfilter if isinstance(storageobject, StorageTableQuery) else ''
+
+        count = 0
+        for entity in self.__probe__(modeldefinition, filter):
+            count += 1
+        return count
+
+    def table_isempty(self, tablename, PartitionKey='', RowKey = '') -> bool:
+        """ True if the table of a registered model has no entity (with PartitionKey and/or RowKey), see isempty
+            raises ModelNotRegisteredError if no registered model uses the table
+        """
+        modeldefinition = self._tableindex.get(tablename, None)
+        if modeldefinition is None:
+            raise ModelNotRegisteredError(tablename)
+
+        filter = StorageTableFilter()
+        if PartitionKey != '':
+            filter = filter & (StorageTableProperty('PartitionKey') == PartitionKey)
+        if RowKey != '':
+            filter = filter & (StorageTableProperty('RowKey') == RowKey)
+
+        for entity in self.__probe__(modeldefinition, str(filter), num_results=1):
+            return False
+        return True
 
     def __encryptionresolver__(self, encryptproperties):
         def encryptionresolver(pk, rk, property_name):
@@ -577,3 +1857,137 @@ class StorageTableContext():
                 return False
         return encryptionresolver
 
+
+class AsyncStorageTableContext(StorageTableContext):
+    """ asyncio interface of StorageTableContext with the same settings and model registration.
+        The blocking azure storage sdk calls run on a thread pool sized like the pooled http session 
+        (AZURE_STORAGE_POOL_SIZE), so the event loop is never blocked and up to pool size requests are in flight.
+    """
+    _executor = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=kwargs.get('AZURE_STORAGE_POOL_SIZE', DEFAULT_POOL_SIZE))
+
+    async def __run__(self, func, *args, **kwargs):
+        """ run a blocking call in the thread pool of this context """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def register_model(self, storagemodel:object):
+        return await self.__run__(super().register_model, storagemodel)
+
+    async def unregister_model(self, storagemodel:object, delete_table=False):
+        return await self.__run__(super().unregister_model, storagemodel, delete_table)
+
+    async def exists(self, storagemodel) -> bool:
+        return await self.__run__(super().exists, storagemodel)
+
+    async def get(self, storagemodel) -> StorageTableModel:
+        return await self.__run__(super().get, storagemodel)
+
+    async def insert(self, storagemodel, overwrite=True) -> StorageTableModel:
+        return await self.__run__(super().insert, storagemodel, overwrite)
+
+    async def replace(self, storagemodel, if_match='*') -> StorageTableModel:
+        return await self.__run__(super().replace, storagemodel, if_match)
+
+    async def merge(self, storagemodel, if_match=None) -> StorageTableModel:
+        return await self.__run__(super().merge, storagemodel, if_match)
+
+    async def delete(self, storagemodel, if_match='*') -> StorageTableModel:
+        return await self.__run__(super().delete, storagemodel, if_match)
+
+    async def update_with_retry(self, storagemodel, modify, retries=3) -> StorageTableModel:
+        """ see StorageTableContext.update_with_retry, modify may be a function or a coroutine function """
+        for storagemodel in self.__attempts__(storagemodel, retries):
+            storagemodel = await self.get(storagemodel)
+            if asyncio.iscoroutinefunction(modify):
+                await modify(storagemodel)
+            else:
+                modify(storagemodel)
+            try:
+                return await self.__conditionalwrite__(storagemodel)
+            except EntityConflictError:
+                pass
+
+    async def query(self, storagequery, raw=False) -> StorageTableQuery:
+        return await self.__run__(super().query, storagequery, raw)
+
+    async def get_many(self, storagemodels, max_workers=DEFAULT_POOL_SIZE) -> list:
+        return await self.__run__(super().get_many, storagemodels, max_workers)
+
+    async def load_relationship(self, storagemodels, relationship, max_workers=DEFAULT_POOL_SIZE, raw=False) -> list:
+        return await self.__run__(super().load_relationship, storagemodels, relationship, max_workers, raw)
+
+    async def query_columns(self, storagequery, page_size=1000, limit=None, tonumpy=False) -> OrderedDict:
+        return await self.__run__(super().query_columns, storagequery, page_size, limit, tonumpy)
+
+    async def isempty(self, storageobject) -> bool:
+        return await self.__run__(super().isempty, storageobject)
+
+    async def count(self, storageobject) -> int:
+        return await self.__run__(super().count, storageobject)
+
+    async def insert_many(self, storagemodels) -> list:
+        return await self.__run__(super().insert_many, storagemodels)
+
+    async def merge_many(self, storagemodels) -> list:
+        return await self.__run__(super().merge_many, storagemodels)
+
+    async def delete_many(self, storagemodels) -> list:
+        return await self.__run__(super().delete_many, storagemodels)
+
+    async def map(self, operation, storageobjects) -> list:
+        """ await an operation (e.g. 'get', 'insert', 'merge', 'delete', 'exists' or any coroutine function) 
+            concurrently for a list of models, results keep the order of storageobjects
+        """
+        if isinstance(operation, str):
+            operation = getattr(self, operation)
+
+        storageobjects = list(storageobjects)
+        results = await asyncio.gather(*[operation(storageobject) for storageobject in storageobjects], return_exceptions=True)
+
+        errors = [(index, result) for index, result in enumerate(results) if isinstance(result, Exception)]
+        if errors:
+            raise BulkOperationError([None if isinstance(result, Exception) else result for result in results], errors)
+
+        return results
+
+    async def iter_query(self, storagequery, page_size=1000, limit=None, raw=False):
+        """ async for over StorageTableModel instances of a query, requested page by page """
+        self.getmodeldefinition(storagequery, True)
+        modelclass = storagequery._storagemodel.__class__
+        pages = self.__querypages__(storagequery, page_size, limit)
+
+        while True:
+            page = await self.__run__(next, pages, None)
+            if page is None:
+                break
+
+            for entity in page:
+                yield entity if raw else modelclass.fromentity(entity)
+
+    async def scan(self, storagequery, ranges=None, max_workers=DEFAULT_POOL_SIZE, page_size=1000, raw=False):
+        """ async for over StorageTableModel instances of a concurrent PartitionKey range scan (see StorageTableContext.scan) """
+        modelclass = storagequery._storagemodel.__class__
+        pages = self.__scanpages__(storagequery, ranges, max_workers, page_size)
+
+        try:
+            while True:
+                page = await self.__run__(next, pages, None)
+                if page is None:
+                    break
+
+                for entity in page:
+                    yield entity if raw else modelclass.fromentity(entity)
+        finally:
+            await self.__run__(pages.close)
+
+    async def flush(self):
+        await self.__run__(super().flush)
+
+    async def close(self):
+        """ flush the write behind buffer and shutdown the thread pool of this context without blocking the event loop """
+        await self.__run__(super().close)
+        await asyncio.get_running_loop().run_in_executor(None, partial(self._executor.shutdown, wait=True))
@@ -0,0 +1,168 @@
+""" config """
+from os import environ
+testconfig = {
+    'AZURE_STORAGE_NAME': environ.get('AZURE_STORAGE_NAME',''),
+    'AZURE_STORAGE_KEY': environ.get('AZURE_STORAGE_KEY',''),
+    'AZURE_REQUIRE_ENCRYPTION': False,
+    'AZURE_STORAGE_IS_EMULATED': False,
+    'AZURE_KEY_IDENTIFIER': 'azurestoragewrap_test',
+    'AZURE_SECRET_KEY': 'supa-dupa-secret-special-key2901'
+}
+
+if testconfig['AZURE_STORAGE_NAME'] == '' and testconfig['AZURE_STORAGE_KEY'] == '':
+    testconfig['AZURE_STORAGE_IS_EMULATED'] = True
+
+""" logging while testing """
+import logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger('azurestoragewrap')
+
+
+""" Import application azurestoragewrap.bulk """
+from azurestoragewrap.table import StorageTableModel, StorageTableContext, StorageTableQuery, PartitionKey, RowKey
+from azurestoragewrap.bulk import import_table, export_table, fileformat, torow, main
+from azurestoragewrap.exception import AzureStorageWrapException
+from azure.storage.table._deserialization import _convert_json_to_entity
+
+# pytest
+import datetime
+import json
+import pytest
+
+
+""" define table test models """
+class TableBulk(StorageTableModel):
+    _datetimeformat = '%d.%m.%Y %H:%M:%S'
+
+    Id = PartitionKey('')
+    Id2 = RowKey('')
+    count = 0
+    beginn = datetime.datetime.strptime('01.01.1900 00:00:00', _datetimeformat)
+    name = ''
+
+
+class TableBulkIso(StorageTableModel):
+    Id = PartitionKey('')
+    Id2 = RowKey('')
+    beginn = datetime.datetime(1900, 1, 1)
+
+
+""" Testcases """
+class TestStorageTableBulk(object):
+
+    def test_fileformat(self):
+        assert fileformat('export.csv') == 'csv'
+        assert fileformat('export.json') == 'jsonl'
+        assert fileformat('export.txt', 'jsonl') == 'jsonl'
+        with pytest.raises(AzureStorageWrapException):
+            fileformat('export.txt')
+
+    def test_torow(self):
+        """ raw entities as deserialized by the sdk carry Int32 as EntityProperty and aware datetimes """
+        entity = _convert_json_to_entity({'PartitionKey': 'a', 'RowKey': '1', 'count': 4, 'beginn@odata.type': 'Edm.DateTime', 'beginn': '2018-01-02T10:00:00Z'}, None, None)
+        row = torow(entity, ['PartitionKey', 'count', 'beginn', 'name'], TableBulk._schema.defaults, {'beginn': TableBulk._datetimeformat})
+        assert row == {'PartitionKey': 'a', 'count': 4, 'beginn': '02.01.2018 10:00:00', 'name': ''}
+        assert json.loads(json.dumps(row)) == row
+
+    def test_import_export(self, tmpdir):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableBulk())
+
+        source = str(tmpdir.join('source.jsonl'))
+        with open(source, 'w') as f:
+            for x in range(0, 250):
+                f.write(json.dumps({'Id': 'test_bulk_{!s}'.format(x % 3), 'Id2': str(x), 'count': x, 'beginn': '02.01.2018 10:00:00', 'name': 'bulk'}) + '\n')
+
+        progress = []
+        result = import_table(db, TableBulk(), source, max_workers=2, progress=lambda rows, failed: progress.append(rows))
+        assert result == {'rows': 250, 'failed': 0} and progress[-1] == 250
+
+        entity = db.get(TableBulk(Id='test_bulk_1', Id2='4'))
+        assert entity._exists and entity.count == 4
+        assert entity.beginn.strftime('%d.%m.%Y %H:%M') == '02.01.2018 10:00' and entity.name == 'bulk'
+
+        target = str(tmpdir.join('target.csv'))
+        result = export_table(db, StorageTableQuery(TableBulk(), pkcondition='eq', pkforeignkey='test_bulk_1'), target, page_size=30)
+        assert result['rows'] == 83
+
+        with open(target) as f:
+            assert f.readline().strip() == 'PartitionKey,RowKey,Id,Id2,count,beginn,name'
+            assert f.readline().strip() == 'test_bulk_1,1,test_bulk_1,1,1,02.01.2018 10:00:00,bulk'
+
+        for x in range(0, 3):
+            db.delete_many(db.query(StorageTableQuery(TableBulk(), pkcondition='eq', pkforeignkey='test_bulk_{!s}'.format(x))))
+
+    def test_import_export_isoformat(self, tmpdir):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableBulkIso())
+
+        source = str(tmpdir.join('source.csv'))
+        with open(source, 'w') as f:
+            f.write('Id,Id2,beginn\n')
+            f.write('test_bulk_iso,1,2018-01-02T10:30:00\n')
+            f.write('test_bulk_iso,2,2018-01-02T10:30:00Z\n')
+            f.write('test_bulk_iso,3,no date\n')
+
+        assert import_table(db, TableBulkIso(), source)['rows'] == 3
+        entities = db.query(StorageTableQuery(TableBulkIso(), pkcondition='eq', pkforeignkey='test_bulk_iso'))
+        assert [entity.beginn.strftime('%Y-%m-%d %H:%M') for entity in entities] == ['2018-01-02 10:30', '2018-01-02 10:30', '1900-01-01 00:00']
+
+        target = str(tmpdir.join('target.jsonl'))
+        export_table(db, StorageTableQuery(TableBulkIso(), pkcondition='eq', pkforeignkey='test_bulk_iso'), target)
+        with open(target) as f:
+            assert json.loads(f.readline())['beginn'] == '2018-01-02T10:30:00'
+
+        db.delete_many(entities)
+
+    def test_import_checkpoint(self, tmpdir):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableBulk())
+
+        source = str(tmpdir.join('source.csv'))
+        with open(source, 'w') as f:
+            f.write('Id,Id2,count\n')
+            for x in range(0, 50):
+                f.write('test_bulk_checkpoint,{!s},{!s}\n'.format(x, x))
+
+        checkpoint = str(tmpdir.join('import.checkpoint'))
+        with open(checkpoint, 'w') as f:
+            json.dump({'rows': 40, 'failed': 0}, f)
+
+        assert import_table(db, TableBulk(), source, checkpoint=checkpoint, checkpoint_rows=4)['rows'] == 50
+        assert db.count(StorageTableQuery(TableBulk(), pkcondition='eq', pkforeignkey='test_bulk_checkpoint')) == 10
+        assert not db.get(TableBulk(Id='test_bulk_checkpoint', Id2='39'))._exists
+
+        db.delete_many(db.query(StorageTableQuery(TableBulk(), pkcondition='eq', pkforeignkey='test_bulk_checkpoint')))
+
+    def test_export_checkpoint(self, tmpdir):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableBulk())
+        db.insert_many([TableBulk(Id='test_bulk_export', Id2='{:02d}'.format(x), count=x) for x in range(0, 25)])
+
+        query = StorageTableQuery(TableBulk(), pkcondition='eq', pkforeignkey='test_bulk_export')
+        target = str(tmpdir.join('target.jsonl'))
+        checkpoint = str(tmpdir.join('export.checkpoint'))
+        assert export_table(db, query, target, page_size=10, checkpoint=checkpoint)['rows'] == 25
+
+        """ rewind the checkpoint to the second page and append a row written after it """
+        with open(target) as f:
+            lines = f.readlines()
+        state = json.load(open(checkpoint))
+        assert state['marker'] is None
+
+        entities, marker = db.__querypage__(db.getmodeldefinition(query, True), query, 10)
+        with open(checkpoint, 'w') as f:
+            json.dump({'rows': 10, 'marker': marker, 'offset': len(''.join(lines[:10]))}, f)
+        with open(target, 'a') as f:
+            f.write('{"partial": \n')
+
+        assert export_table(db, query, target, page_size=10, checkpoint=checkpoint)['rows'] == 25
+        with open(target) as f:
+            assert f.readlines() == lines
+        assert [json.loads(line)['count'] for line in lines] == list(range(0, 25))
+
+        db.delete_many(db.query(query))
+
+    def test_main(self, tmpdir):
+        assert main([]) == 2
+        assert main(['import', 'azurestoragewrap.table:StorageTableQuery', str(tmpdir.join('source.csv'))]) == 1
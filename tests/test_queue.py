@@ -20,7 +20,7 @@ log = logging.getLogger('azurestoragewrap')
 
 """ Import application azurestoragewrap.table """        
 from azurestoragewrap.queue import StorageQueueContext, StorageQueueModel
-from azurestoragewrap.exception import NameConventionError, AzureStorageWrapException
+from azurestoragewrap.exception import NameConventionError, AzureStorageWrapException, BulkOperationError
 
 """ imports & Globals """
 import time, datetime
@@ -48,6 +48,13 @@ class QueueTwo(StorageQueueModel):
     protocol = ''
 
 
+class QueueFour(StorageQueueModel):
+    _queuename = 'getmanytest'
+
+    epgid = 0
+    resolution = ''
+
+
 class QueueThree(StorageQueueModel):
     _queuename = 'NamingDoesNotFit'
 
@@ -73,6 +80,22 @@ class TestStorageQueuePositive(object):
         queue.put(message)
         queue.delete(message)
 
+    def test_put_many(self):
+        queue = StorageQueueContext(**testconfig)
+        queue.register_model(QueueOne())
+        messages = queue.put_many([QueueOne(epgid = x, resolution = 'test_put_many') for x in range(0, 20)], max_workers=4)
+        assert [message.epgid for message in messages] == list(range(0, 20))
+        assert all([not message.id is None and not message.pop_receipt is None for message in messages])
+
+        """ a failed message does not abort the others """
+        with pytest.raises(BulkOperationError) as e:
+            queue.put_many([QueueOne(epgid = 20, resolution = 'test_put_many'), QueueThree()])
+        assert [index for index, error in e.value.errors] == [1]
+        assert e.value.results[0].epgid == 20
+
+        for message in messages + [e.value.results[0]]:
+            queue.delete(message)
+
     def test_peek(self):
         queue = StorageQueueContext(**testconfig)
         queue.register_model(QueueOne())        
@@ -120,6 +143,27 @@ class TestStorageQueuePositive(object):
 
         queue.delete(testmessage)
 
+    def test_get_many(self):
+        queue = StorageQueueContext(**testconfig)
+        queue.register_model(QueueFour())
+        queue.put_many([QueueFour(epgid = x, resolution = 'test_get_many') for x in range(0, 40)])
+
+        peekmessages = queue.peek_many(QueueFour(), 50)
+        assert len(peekmessages) == 32 and len(set([message.epgid for message in peekmessages])) == 32
+
+        """ put_many sends concurrently and queues do not guarantee order """
+        getmessages = queue.get_many(QueueFour(), 35, hide=10)
+        assert len(set([message.epgid for message in getmessages])) == 35
+        assert all([isinstance(message, QueueFour) and not message.pop_receipt is None for message in getmessages])
+
+        getmessages += queue.get_many(QueueFour())
+        assert sorted([message.epgid for message in getmessages]) == list(range(0, 40))
+        assert queue.get_many(QueueFour()) == []
+
+        for message in getmessages:
+            queue.delete(message)
+        queue.unregister_model(QueueFour(), delete_queue=True)
+
     def test_unregister_model(self):
         queue = StorageQueueContext(**testconfig)
         message = QueueOne() 
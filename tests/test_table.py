@@ -20,14 +20,18 @@ log = logging.getLogger('azurestoragewrap')
 
 
 """ Import application azurestoragewrap.table """        
-from azurestoragewrap.table import StorageTableModel, StorageTableContext, StorageTableQuery, PartitionKey, RowKey, EncryptKey
+from azurestoragewrap.table import StorageTableModel, StorageTableContext, AsyncStorageTableContext, StorageTableQuery, StorageTableFilter, StorageTableProperty, PartitionKey, RowKey, EncryptKey
+from azurestoragewrap.snippets import keyspace_ranges
+from azure.storage.table._deserialization import _convert_json_to_entity
 
 
 # Exeptions
-from azurestoragewrap.exception import NameConventionError, ModelRegisteredMoreThanOnceError, ModelNotRegisteredError
+from azurestoragewrap.exception import AzureStorageWrapException, NameConventionError, ModelRegisteredMoreThanOnceError, ModelNotRegisteredError, BulkOperationError, EntityConflictError
 
 # pytest
 import time, datetime
+import asyncio
+import tracemalloc
 import pytest
 
 
@@ -61,6 +65,22 @@ class Table4(StorageTableModel):
     Id2 = RowKey('')
     TableName = True
 
+class Table6(StorageTableModel):
+    _compact = True
+    _datetimeformat = '%d.%m.%Y %H:%M:%S'
+
+    Id = PartitionKey(0)
+    Id2 = RowKey('')
+    beginn = datetime.datetime.strptime('01.01.1900 00:00:00', _datetimeformat)
+    ende  = datetime.datetime.strptime('01.01.1900 00:00:00', _datetimeformat)
+
+class Table7(StorageTableModel):
+    _compact = True
+
+    Id = PartitionKey(0)
+    Id2 = RowKey('')
+    OneToN = StorageTableQuery(TableTwo(), pkcondition='eq', pkforeignkey='Id2')
+
 class TableNameConventionError(StorageTableModel):
     _tablename = '!"§$%&/()=?asdkjkllllllllllllllllllllllllllllllllllllllllllllllllllllllllalsdalsnclyxnvxcvjndfnldnböfgnbköfgböfnbälfkgbkfgmblfk gbl flbknowerpweufndkövnvndlfvndöjfnvoeruvnköjvxkv'
     Id = PartitionKey(0)
@@ -93,6 +113,42 @@ class TestStorageTablePositive(object):
         db.register_model(TableOne())
         assert 'TableOne' in [model['modelname'] for model in db._modeldefinitions]
 
+    def test_shared_tableservice(self):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableOne())
+        db.register_model(Table4())
+        db.register_model(TableTwo())
+        modeldefinitions = {model['modelname']: model for model in db._modeldefinitions}
+        assert modeldefinitions['TableOne']['tableservice'] is modeldefinitions['Table4']['tableservice']
+        assert not modeldefinitions['TableOne']['tableservice'] is modeldefinitions['TableTwo']['tableservice']
+        assert modeldefinitions['TableTwo']['tableservice'].request_session is db._requestsession
+
+    def test_model_schema(self):
+        schema = TableTwo._schema
+        assert schema.tablename == 'TableTwo'
+        assert schema.partitionkey == 'Id' and schema.rowkey == 'Id2'
+        assert schema.encrypt == ['Secret', 'Secret2']
+        assert TableThree._schema.relationships == ['OneToN']
+        assert not 'PartitionKey' in Table5._schema.properties
+
+    def test_compact_model(self):
+        entity = Table6(Id=1, Id2='test_compact_model', beginn='01.02.2000 10:00:00')
+        assert not hasattr(entity, '__dict__')
+        assert entity._tablename == 'Table6' and entity.getRowKey() == 'test_compact_model'
+        assert entity.entity()['beginn'] == datetime.datetime(2000, 2, 1, 10, 0)
+
+        """ benchmark memory per instance """
+        memory = {}
+        for model in [TableOne, Table6]:
+            tracemalloc.start()
+            entities = [model(Id=x, Id2='test_compact_model') for x in range(0, 10000)]
+            memory[model.__name__] = tracemalloc.get_traced_memory()[0] / len(entities)
+            tracemalloc.stop()
+            del entities
+
+        log.info('memory per instance: {!s}'.format(memory))
+        assert memory['Table6'] < memory['TableOne']
+
     def test_exists_entry(self):
         db = StorageTableContext(**testconfig)
         db.register_model(TableOne())
@@ -124,6 +180,214 @@ class TestStorageTablePositive(object):
        
         db.delete(mergeentity)
 
+    def test_insert_many(self):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableOne())
+
+        entities = [TableOne(Id=x % 2, Id2='test_insert_many_{!s}'.format(x)) for x in range(0, 150)]
+        entities = db.insert_many(entities)
+        assert len(entities) == 150
+        assert all([entity._exists for entity in entities])
+        assert db.exists(TableOne(Id=1, Id2='test_insert_many_149'))
+
+        entities = db.delete_many(entities)
+        assert not any([entity._exists for entity in entities])
+        assert not db.exists(TableOne(Id=1, Id2='test_insert_many_149'))
+
+    def test_get_many(self):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableOne())
+
+        db.insert_many([TableOne(Id=x % 2, Id2='test_get_many_{!s}'.format(x), beginn=datetime.datetime(2018, 1, 1, x % 24, 0)) for x in range(0, 40)])
+
+        entities = db.get_many([TableOne(Id=x % 2, Id2='test_get_many_{!s}'.format(x)) for x in range(0, 42)])
+        assert len(entities) == 42
+        assert all([entity._exists for entity in entities[:40]]) and not any([entity._exists for entity in entities[40:]])
+        assert all([entity.beginn.hour == x % 24 for x, entity in enumerate(entities[:40])])
+
+        db.delete_many(entities[:40])
+
+    def test_map(self):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableOne())
+
+        entities = [TableOne(Id=1, Id2='test_map_{!s}'.format(x)) for x in range(0, 20)]
+        entities = db.map('insert', entities, max_workers=5)
+        assert all([entity._exists for entity in entities])
+
+        entities = db.map(db.get, [TableOne(Id=1, Id2='test_map_{!s}'.format(x)) for x in range(0, 20)], max_workers=5)
+        assert [entity.Id2 for entity in entities] == ['test_map_{!s}'.format(x) for x in range(0, 20)]
+        assert all([entity._exists for entity in entities])
+
+        db.map('delete', entities)
+
+    def test_async_context(self):
+        async def run():
+            db = AsyncStorageTableContext(**testconfig)
+            await db.register_model(TableOne())
+
+            entities = await db.map('insert', [TableOne(Id=2, Id2='test_async_context_{!s}'.format(x)) for x in range(0, 10)])
+            assert all([entity._exists for entity in entities])
+
+            entity = await db.get(TableOne(Id=2, Id2='test_async_context_1'))
+            assert entity._exists
+
+            async def later(entity):
+                entity.ende = datetime.datetime(2018, 1, 1, 12, 0)
+            entity = await db.update_with_retry(TableOne(Id=2, Id2='test_async_context_1'), later)
+            assert entity._exists and entity.ende == datetime.datetime(2018, 1, 1, 12, 0)
+
+            entities = [entity async for entity in db.iter_query(StorageTableQuery(TableOne(), 'eq', 2), page_size=3)]
+            assert len(entities) == 10
+
+            entities = await db.get_many([TableOne(Id=2, Id2='test_async_context_{!s}'.format(x)) for x in range(0, 10)], max_workers=2)
+            assert all([entity._exists for entity in entities])
+
+            await db.delete_many(entities)
+            await db.close()
+
+        asyncio.run(run())
+
+    def test_cache(self):
+        config = dict(testconfig, AZURE_TABLE_CACHE_SIZE=10, AZURE_TABLE_CACHE_TTL=60)
+        db = StorageTableContext(**config)
+        db.register_model(TableOne())
+
+        db.insert(TableOne(Id=1, Id2='test_cache'))
+        for x in range(0, 5):
+            entity = db.get(TableOne(Id=1, Id2='test_cache'))
+            assert entity._exists
+        assert db.cache_info()['hits'] == 4 and db.cache_info()['misses'] == 1
+
+        db.delete(entity)
+        assert not db.get(TableOne(Id=1, Id2='test_cache'))._exists
+        assert db.cache_info()['misses'] == 2
+
+    def test_write_behind_buffer(self):
+        config = dict(testconfig, AZURE_TABLE_BUFFER_SIZE=150, AZURE_TABLE_BUFFER_AGE=0.5)
+        db = StorageTableContext(**config)
+        db.register_model(TableOne())
+
+        entities = [db.insert(TableOne(Id=x % 2, Id2='test_write_behind_buffer_{!s}'.format(x))) for x in range(0, 300)]
+        db.flush()
+        assert all([entity._exists for entity in entities])
+        assert db.buffer_info()['committed'] == 300 and db.buffer_info()['size'] == 0
+
+        """ a single model is written after AZURE_TABLE_BUFFER_AGE seconds """
+        entity = db.insert(TableOne(Id=2, Id2='test_write_behind_buffer'))
+        time.sleep(1.5)
+        assert entity._exists and db.get(TableOne(Id=2, Id2='test_write_behind_buffer'))._exists
+
+        db.insert(TableOne(Id=3, Id2='test_write_behind_buffer'))
+        db.close()
+        assert db.get(TableOne(Id=3, Id2='test_write_behind_buffer'))._exists
+        with pytest.raises(AzureStorageWrapException):
+            db.insert(TableOne(Id=4, Id2='test_write_behind_buffer'))
+
+        db.delete_many(entities + [TableOne(Id=x, Id2='test_write_behind_buffer') for x in [2, 3]])
+
+    def test_merge_entity_serverside(self):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableOne())
+
+        beginn = datetime.datetime(2018, 1, 1, 10, 0)
+        ende = datetime.datetime(2018, 1, 1, 12, 0)
+        db.insert(TableOne(Id=1, Id2='test_merge_entity_serverside', beginn=beginn))
+
+        mergeentity = db.merge(TableOne(Id=1, Id2='test_merge_entity_serverside', ende=ende))
+        assert mergeentity._exists
+
+        readentity = db.get(TableOne(Id=1, Id2='test_merge_entity_serverside'))
+        assert readentity.beginn.replace(tzinfo=None) == beginn and readentity.ende.replace(tzinfo=None) == ende
+
+        db.delete(readentity)
+
+        """ merge does not create missing entities, encrypted or not """
+        db.register_model(TableTwo())
+        for mergeentity in [TableOne(Id=1, Id2='test_merge_entity_serverside', ende=ende), TableTwo(Id=1, Id2='test_merge_entity_serverside', NonSecret='NonSecret')]:
+            mergeentity = db.merge(mergeentity)
+            assert not mergeentity._exists and not db.exists(mergeentity)
+
+    def test_delta(self):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableOne())
+
+        db.insert(TableOne(Id=1, Id2='test_delta', beginn=datetime.datetime(2018, 1, 1, 10, 0)))
+
+        entity = db.get(TableOne(Id=1, Id2='test_delta'))
+        assert entity.delta() == {'PartitionKey': '1', 'RowKey': 'test_delta'}
+
+        entity.ende = datetime.datetime(2018, 1, 1, 12, 0)
+        assert entity.delta() == {'PartitionKey': '1', 'RowKey': 'test_delta', 'ende': datetime.datetime(2018, 1, 1, 12, 0)}
+
+        entity = db.merge(entity)
+        assert entity.delta() == {'PartitionKey': '1', 'RowKey': 'test_delta'}
+
+        db.delete(entity)
+
+    def test_etag_conflict(self):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableOne())
+
+        writeentity = db.insert(TableOne(Id=1, Id2='test_etag_conflict'))
+        assert not writeentity._etag is None
+
+        with pytest.raises(EntityConflictError):
+            db.insert(TableOne(Id=1, Id2='test_etag_conflict'), overwrite=False)
+
+        first = db.get(TableOne(Id=1, Id2='test_etag_conflict'))
+        second = db.get(TableOne(Id=1, Id2='test_etag_conflict'))
+        assert first._etag == second._etag
+
+        first.beginn = datetime.datetime(2018, 1, 1, 10, 0)
+        first = db.merge(first, if_match=first._etag)
+
+        second.ende = datetime.datetime(2018, 1, 1, 12, 0)
+        with pytest.raises(EntityConflictError):
+            db.replace(second, if_match=second._etag)
+
+        with pytest.raises(EntityConflictError):
+            db.delete(second, if_match=second._etag)
+
+        db.delete(first, if_match=first._etag)
+        assert not db.exists(TableOne(Id=1, Id2='test_etag_conflict'))
+
+        """ other service errors are raised, e.g. a bad request because of a RowKey with / """
+        with pytest.raises(AzureStorageWrapException):
+            db.insert(TableOne(Id=1, Id2='test/etag_conflict'))
+        with pytest.raises(AzureStorageWrapException):
+            db.replace(TableOne(Id=1, Id2='test/etag_conflict'))
+
+    def test_update_with_retry(self):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableOne())
+
+        attempts = []
+        def later(entity):
+            """ create the entity in between on the first attempt """
+            if not attempts:
+                db.insert(TableOne(Id=1, Id2='test_update_with_retry', beginn=datetime.datetime(2018, 1, 1, 10, 0)))
+            attempts.append(entity)
+            entity.ende = datetime.datetime(2018, 1, 1, 12, 0)
+
+        entity = db.update_with_retry(TableOne(Id=1, Id2='test_update_with_retry'), later)
+        assert len(attempts) == 2 and attempts[0].getPartitionKey() == '1'
+        assert entity.beginn.replace(tzinfo=None) == datetime.datetime(2018, 1, 1, 10, 0) and entity.ende == datetime.datetime(2018, 1, 1, 12, 0)
+
+        """ an entity deleted in between is inserted on the next attempt """
+        deleted = []
+        def vanish(entity):
+            if not deleted:
+                db.delete(TableOne(Id=1, Id2='test_update_with_retry'))
+            deleted.append(entity._exists)
+            entity.ende = datetime.datetime(2018, 1, 2, 12, 0)
+
+        entity = db.update_with_retry(TableOne(Id=1, Id2='test_update_with_retry'), vanish)
+        assert deleted == [True, False]
+        assert db.get(TableOne(Id=1, Id2='test_update_with_retry')).ende.day == 2
+
+        db.delete(entity)
+
     def test_partly_encryption(self):
         db = StorageTableContext(**testconfig)
         db.register_model(TableTwo())
@@ -152,6 +416,206 @@ class TestStorageTablePositive(object):
         entity.OneToN = db.query(entity.OneToN)
         assert len(entity.OneToN) == 10
 
+    def test_query_hydrate(self):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableTwo())
+
+        for x in range(1,6):
+            db.insert(TableTwo(Id='Hydrate', Id2 = x, Secret='Secret', NonSecret='NonSecret'))
+
+        query = db.query(StorageTableQuery(TableTwo(), pkcondition='eq', pkforeignkey='Hydrate'))
+        assert len(query) == 5
+        assert all([isinstance(item, TableTwo) and item._exists and not item._etag is None for item in query])
+        assert all([item.Secret == 'Secret' and item.Secret2 == 'second encrypt' for item in query])
+        assert query[0].delta() == {'PartitionKey': 'Hydrate', 'RowKey': '1'}
+
+        query = db.query(StorageTableQuery(TableTwo(), pkcondition='eq', pkforeignkey='Hydrate', select=['NonSecret']))
+        assert query[0].Id == 'Hydrate' and query[0].Secret == ''
+
+        query = db.query(StorageTableQuery(TableTwo(), pkcondition='eq', pkforeignkey='Hydrate'), raw=True)
+        assert all([isinstance(item, dict) for item in query])
+
+        db.delete_many([TableTwo(Id='Hydrate', Id2 = x) for x in range(1,6)])
+
+    def test_model_fromentity(self):
+        """ entities as the sdk deserializes service responses: Int32 as EntityProperty, Int64 as int, aware datetimes """
+        entity = TableOne.fromentity(_convert_json_to_entity({'PartitionKey': '6', 'RowKey': 'a', 'Id': 6, 'Id2': 'a', 'beginn@odata.type': 'Edm.DateTime', 'beginn': '2018-01-01T10:00:00Z', 'odata.etag': 'W/"1"'}, None, None))
+        assert entity.Id == 6 and entity.getPartitionKey() == '6' and entity.Id2 == 'a'
+        assert entity.beginn.replace(tzinfo=None) == datetime.datetime(2018, 1, 1, 10, 0)
+        assert entity._exists and entity._etag == 'W/"1"' and entity.delta() == {'PartitionKey': '6', 'RowKey': 'a'}
+
+        entity = TableOne.fromentity(_convert_json_to_entity({'PartitionKey': '7', 'RowKey': 'a', 'Id@odata.type': 'Edm.Int64', 'Id': '7'}, None, None))
+        assert entity.Id == 7 and entity.getPartitionKey() == '7'
+
+        entity = TableOne.fromentity(_convert_json_to_entity({'PartitionKey': '8', 'RowKey': 'a'}, None, None))
+        assert entity.Id == 8 and entity.Id2 == 'a'
+
+        entity = Table6.fromentity(_convert_json_to_entity({'PartitionKey': '1', 'RowKey': 'a', 'Id': 1, 'Id2': 'a', 'ende': '01.02.2000 10:00:00'}, None, None))
+        assert entity.Id == 1 and entity.ende == datetime.datetime(2000, 2, 1, 10, 0) and entity._tablename == 'Table6'
+
+        entity = TableThree.fromentity(_convert_json_to_entity({'PartitionKey': '1', 'RowKey': 'b'}, None, None))
+        assert entity.OneToN._queryfilter == "PartitionKey eq 'b'"
+
+    def test_hydrate(self):
+        """ get/ get_many/ update_with_retry sync the model with sdk deserialized entities """
+        db = StorageTableContext(**testconfig)
+        entity = TableOne(Id=6, Id2='a')
+        db.__hydrate__(entity, _convert_json_to_entity({'PartitionKey': '6', 'RowKey': 'a', 'Id': 6, 'Id2': 'a', 'ende': '01.02.2000 10:00:00', 'odata.etag': 'W/"2"'}, None, None))
+        assert entity.Id == 6 and entity.getPartitionKey() == '6' and entity.getRowKey() == 'a'
+        assert entity.ende == datetime.datetime(2000, 2, 1, 10, 0) and entity.beginn == datetime.datetime(1900, 1, 1, 0, 0)
+        assert entity._exists and entity._etag == 'W/"2"' and entity.delta() == {'PartitionKey': '6', 'RowKey': 'a'}
+
+    def test_load_relationship(self):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableTwo())
+        db.register_model(TableThree())
+
+        for x in range(1,11):
+            db.insert(TableTwo(Id='Fourth', Id2 = x, Secret='Secret', NonSecret='NonSecret'))
+        for x in range(1,6):
+            db.insert(TableTwo(Id='Fifth', Id2 = x, Secret='Secret', NonSecret='NonSecret'))
+
+        entities = [TableThree(Id=1, Id2='Fourth'), TableThree(Id=2, Id2='Fifth'), TableThree(Id=3, Id2='Fourth'), TableThree(Id=4, Id2='Sixth')]
+        entities = db.load_relationship(entities, 'OneToN')
+        assert [len(entity.OneToN) for entity in entities] == [10, 5, 10, 0]
+        assert all([item.Secret == 'Secret' for item in entities[1].OneToN])
+
+        """ relationships of compact models """
+        entities = db.load_relationship([Table7(Id=1, Id2='Fourth'), Table7(Id=2, Id2='Fifth')], 'OneToN')
+        assert [len(entity.OneToN) for entity in entities] == [10, 5]
+
+        with pytest.raises(AzureStorageWrapException):
+            db.load_relationship(entities, 'Id2')
+
+    def test_filter(self):
+        where = (StorageTableProperty('PartitionKey') == 1) & (StorageTableProperty('Name') == "O'Neil")
+        assert str(where) == "(PartitionKey eq '1') and (Name eq 'O''Neil')"
+
+        where = (StorageTableProperty('beginn') >= datetime.datetime(2018, 1, 1, 10, 0)) | ~(StorageTableProperty('Active') == True)
+        assert str(where) == "(beginn ge datetime'2018-01-01T10:00:00.000000Z') or (not (Active eq true))"
+
+        where = StorageTableProperty('RowKey').startswith('2018-01') & (StorageTableProperty('Count') > 2**40)
+        assert str(where) == "((RowKey ge '2018-01') and (RowKey lt '2018-02')) and (Count gt 1099511627776L)"
+
+        query = StorageTableQuery(TableOne(), pkcondition='eq', pkforeignkey="it's").where(StorageTableProperty('ende') < datetime.datetime(2018, 1, 1))
+        assert query._queryfilter == "(PartitionKey eq 'it''s') and (ende lt datetime'2018-01-01T00:00:00.000000Z')"
+
+        assert str(StorageTableProperty('beginn') >= datetime.datetime(2018, 1, 1, 0, 0, 0, 500000)) == "beginn ge datetime'2018-01-01T00:00:00.500000Z'"
+        assert str(~StorageTableFilter()) == '' and str(StorageTableFilter() & ~StorageTableFilter()) == ''
+
+    def test_query_index(self):
+        query = StorageTableQuery(TableOne())
+        query.extend([{'PartitionKey': str(x % 3), 'RowKey': str(x), 'Count': x % 10} for x in range(0, 100)])
+        query.create_index('Count', 'PartitionKey')
+
+        assert len(query.find('Count', 5)) == 10
+        assert query.find('Count', ('lt', 2)) == [item for item in query if item['Count'] < 2]
+        assert query.find('Count', ('ge', 8)) == [item for item in query if item['Count'] >= 8]
+        assert len(query.find('RowKey', ('gt', '95'))) == 4
+
+        query.append({'PartitionKey': '0', 'RowKey': '100', 'Count': 5})
+        assert len(query.find('Count', 5)) == 11
+
+        query.filter('PartitionKey', ['1', '2'])
+        assert len(query) == 66 and len(query.find('Count', 5)) == 7
+
+    def test_query_columns(self):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableOne())
+
+        db.insert_many([TableOne(Id=6, Id2='test_query_columns_{!s}'.format(x), beginn=datetime.datetime(2018, 1, 1, x, 0)) for x in range(0, 10)])
+
+        query = db.query(StorageTableQuery(TableOne(), pkcondition='eq', pkforeignkey=6))
+        columns = query.to_columns()
+        assert list(columns.keys()) == ['PartitionKey', 'RowKey', 'Id', 'Id2', 'beginn', 'ende']
+        assert columns['beginn'] == [datetime.datetime(2018, 1, 1, x, 0) for x in range(0, 10)]
+
+        columns = db.query_columns(StorageTableQuery(TableOne(), pkcondition='eq', pkforeignkey=6, select=['beginn']), page_size=3)
+        assert list(columns.keys()) == ['PartitionKey', 'RowKey', 'Id', 'Id2', 'beginn'] and len(columns['beginn']) == 10
+
+        numpy = pytest.importorskip('numpy')
+        arrays = query.to_numpy()
+        assert arrays['Id'].dtype == numpy.int64 and arrays['beginn'].dtype == numpy.dtype('datetime64[us]')
+
+        arrays = db.query_columns(StorageTableQuery(TableOne(), pkcondition='eq', pkforeignkey=6, select=['Id']), tonumpy=True)
+        assert arrays['Id'].tolist() == [6] * 10
+
+        """ entities written by other clients carry Int32 properties (EntityProperty) """
+        query.append(_convert_json_to_entity({'PartitionKey': '7', 'RowKey': 'a', 'Id': 7, 'Id2': 'a'}, None, None))
+        assert query.to_numpy()['Id'].tolist() == [6] * 10 + [7]
+
+        db.delete_many([TableOne(Id=6, Id2='test_query_columns_{!s}'.format(x)) for x in range(0, 10)])
+
+    def test_scan(self):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableTwo())
+
+        keys = ['{:x}_test_scan'.format(x) for x in range(0, 64)] + ['Z_test_scan']
+        for key in keys:
+            db.insert(TableTwo(Id=key, Id2='test_scan', NonSecret='NonSecret'))
+
+        query = StorageTableQuery(TableTwo()).where(StorageTableProperty('RowKey') == 'test_scan')
+        entities = [entity for entity in db.scan(query, max_workers=4, page_size=10)]
+        assert sorted([entity.Id for entity in entities]) == sorted(keys)
+        assert all([isinstance(entity, TableTwo) for entity in entities])
+
+        entities = [entity for entity in db.scan(query, ranges=[(None, '4'), ('4', None)])]
+        assert len(entities) == len(keys)
+
+        db.delete_many(entities)
+
+    def test_isempty_count(self):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableOne())
+
+        query = StorageTableQuery(TableOne(), pkcondition='eq', pkforeignkey=7)
+        assert db.isempty(query) and db.count(query) == 0
+
+        db.insert_many([TableOne(Id=7, Id2='test_isempty_count_{!s}'.format(x)) for x in range(0, 10)])
+        assert not db.isempty(query) and not db.isempty(TableOne())
+        assert db.count(query) == 10
+        assert db.count(StorageTableQuery(TableOne(), pkcondition='eq', pkforeignkey=7, rkcondition='eq', rkforeignkey='test_isempty_count_3')) == 1
+        assert not db.table_isempty('TableOne', PartitionKey=7, RowKey='test_isempty_count_3')
+        assert db.table_isempty('TableOne', PartitionKey=7, RowKey='test_isempty_count_10')
+        with pytest.raises(ModelNotRegisteredError):
+            db.table_isempty('TabelOne')
+
+        db.delete_many([TableOne(Id=7, Id2='test_isempty_count_{!s}'.format(x)) for x in range(0, 10)])
+        assert db.isempty(query)
+
+    def test_keyspace_ranges(self):
+        assert keyspace_ranges(4) == [(None, '4'), ('4', '8'), ('8', 'c'), ('c', None)]
+        assert keyspace_ranges(3, 'ab') == [(None, 'ab'), ('ab', 'ba'), ('ba', None)]
+        assert len(keyspace_ranges(100)) == 100
+
+    def test_query_where(self):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableOne())
+
+        db.insert_many([TableOne(Id=5, Id2='test_query_where_{!s}'.format(x), beginn=datetime.datetime(2018, 1, 1, x, 0)) for x in range(0, 10)])
+
+        query = StorageTableQuery(TableOne(), pkcondition='eq', pkforeignkey=5)
+        query = db.query(query.where(StorageTableProperty('beginn').between(datetime.datetime(2018, 1, 1, 2, 0), datetime.datetime(2018, 1, 1, 5, 0))))
+        assert len(query) == 3
+
+        db.delete_many([TableOne(Id=5, Id2='test_query_where_{!s}'.format(x)) for x in range(0, 10)])
+
+    def test_iter_query(self):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableTwo())
+        db.register_model(TableThree())
+
+        for x in range(1,11):
+            db.insert(TableTwo(Id='Third', Id2 = x, Secret='Secret', NonSecret='NonSecret'))
+
+        entity = TableThree(Id=1, Id2='Third')
+        entities = [item for item in db.iter_query(entity.OneToN, page_size=3)]
+        assert len(entities) == 10
+        assert all([isinstance(item, TableTwo) and item.Secret == 'Secret' for item in entities])
+
+        entities = [item for item in db.iter_query(entity.OneToN, page_size=3, limit=5)]
+        assert len(entities) == 5
+
     def test_newtablemodel(self):
         db = StorageTableContext(**testconfig)
         db.register_model(Table4())
@@ -160,16 +624,17 @@ class TestStorageTablePositive(object):
         db.insert(model)
         assert model.TableName == True
 
-    """def test_query_select(self):
+    def test_query_select(self):
         db = StorageTableContext(**testconfig)
         db.register_model(TableTwo())
 
         for x in range(1,11):
             db.insert(TableTwo(Id='First', Id2 = x, Secret='Secret', NonSecret='NonSecret'))
 
-        query = StorageTableQuery(TableTwo(),'eq','First','eq', 1, ['Secret','NonSecret'])
-        query = db.query(query)
-        assert len(query) == 1"""
+        query = StorageTableQuery(TableTwo(),'eq','First','eq', 1, ['NonSecret'])
+        query = db.query(query, raw=True)
+        assert len(query) == 1
+        assert query[0]['NonSecret'] == 'NonSecret' and not 'Secret' in query[0]
 
     def test_PartitionKeyAttribute(self):
         db = StorageTableContext(**testconfig)
@@ -208,6 +673,18 @@ class TestStorageTableNegative(object):
         with pytest.raises(NameConventionError):
             db.register_model(TableNameConventionError())
 
+    def test_query_select_unknown_property(self):
+        with pytest.raises(AzureStorageWrapException):
+            query = StorageTableQuery(TableTwo(), 'eq', 'First', select=['Unknown'])
+
+    def test_map_errors(self):
+        db = StorageTableContext(**testconfig)
+        db.register_model(TableOne())
+        with pytest.raises(BulkOperationError) as excinfo:
+            db.map('get', [TableOne(Id=1, Id2='test_map_errors'), Table4(Id=1, Id2='test_map_errors')])
+        assert len(excinfo.value.errors) == 1 and excinfo.value.errors[0][0] == 1
+        assert isinstance(excinfo.value.results[0], TableOne)
+
     def test_register_model_first(self):
         db = StorageTableContext(**testconfig)
         with pytest.raises(ModelNotRegisteredError):